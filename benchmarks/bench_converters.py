@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for handle_conversation: the compiled converters against
+the previous handle_object path (reflective to_dict + parse_dates at every
+level), and the raw_analytics path (json.loads + raw converters) against
+deserializing the response body into SDK models first. Before timing,
+both paths are checked to give the same conversation and user details
+records. Run with `python benchmarks/bench_converters.py`.
+"""
+
+import argparse
+import datetime
+import json
+import timeit
+
+import PureCloudPlatformApiSdk
+
+import tap_purecloud
+from fake_purecloud import make_conversation, make_user_detail
+
+
+def handle_object(obj):
+    return tap_purecloud.parse_dates(obj.to_dict())
+
+
+def legacy_handle_conversation(conversation_record):
+    conversation = handle_object(conversation_record)
+
+    participants = []
+    for participant_record in conversation_record.participants:
+        participants.append(handle_object(participant_record))
+
+        sessions = []
+        for session_record in participant_record.sessions:
+            sessions.append(handle_object(session_record))
+
+            segments = []
+            for segment_record in session_record.segments:
+                segments.append(handle_object(segment_record))
+
+            sessions[-1]['segments'] = segments
+        participants[-1]['sessions'] = sessions
+    conversation['participants'] = participants
+
+    return conversation
+
+
+class FakeResponse(object):
+    def __init__(self, data):
+        self.data = json.dumps(data)
+
+
+def deserialize_conversations(response):
+    api_client = PureCloudPlatformApiSdk.ApiClient()
+    return api_client.deserialize(response, 'list[AnalyticsConversation]')
+
+
+def sdk_handle_response(response):
+    return [tap_purecloud.handle_conversation(c) for c in deserialize_conversations(response)]
+
+
+def raw_handle_response(response):
+    return [tap_purecloud.handle_raw_conversation(c) for c in json.loads(response.data)]
+
+
+def check_user_details(count):
+    # user details go through their own raw converter, so check them too
+    start = datetime.datetime(2018, 1, 1)
+    response = FakeResponse([make_user_detail(i, start) for i in range(count)])
+
+    api_client = PureCloudPlatformApiSdk.ApiClient()
+    user_details = api_client.deserialize(response, 'list[AnalyticsUserDetail]')
+
+    sdk_records = [tap_purecloud.handle_user_details(u) for u in user_details]
+    raw_records = [tap_purecloud.handle_raw_user_details(u) for u in json.loads(response.data)]
+    if sdk_records != raw_records:
+        raise RuntimeError("Raw converters disagree with the SDK models for user details")
+
+
+def best_time(run, repeat):
+    return min(timeit.repeat(run, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--conversations', type=int, default=500)
+    parser.add_argument('--participants', type=int, default=3)
+    parser.add_argument('--sessions', type=int, default=2)
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    raw = [make_conversation(i, args.participants, args.sessions, args.segments) for i in range(args.conversations)]
+    response = FakeResponse(raw)
+    conversations = deserialize_conversations(response)
+
+    for conversation in conversations:
+        if legacy_handle_conversation(conversation) != tap_purecloud.handle_conversation(conversation):
+            raise RuntimeError("Converters disagree on {}".format(conversation.conversation_id))
+
+    if sdk_handle_response(response) != raw_handle_response(response):
+        raise RuntimeError("Raw converters disagree with the SDK models")
+    check_user_details(args.conversations)
+
+    print("From SDK models:")
+    results = {}
+    for name, handle in [('to_dict', legacy_handle_conversation), ('compiled', tap_purecloud.handle_conversation)]:
+        results[name] = best_time(lambda: [handle(c) for c in conversations], args.repeat)
+        print("{:>10}: {:8.2f} us/conversation".format(name, 1e6 * results[name] / len(conversations)))
+    print("   speedup: {:8.2f}x".format(results['to_dict'] / results['compiled']))
+
+    print("From the response body:")
+    for name, handle in [('sdk', sdk_handle_response), ('raw', raw_handle_response)]:
+        results[name] = best_time(lambda: handle(response), args.repeat)
+        print("{:>10}: {:8.2f} us/conversation".format(name, 1e6 * results[name] / len(conversations)))
+    print("   speedup: {:8.2f}x".format(results['sdk'] / results['raw']))
+
+
+if __name__ == '__main__':
+    main()
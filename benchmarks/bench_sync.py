@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+End to end throughput benchmark: runs each sync_* function against a local
+fake PureCloud API (see fake_purecloud.py) and reports records/s,
+requests/s, peak RSS and wall time. Each sync runs in a fresh process so
+its peak RSS is its own. Results are appended, with the current commit, to
+benchmarks/results.jsonl so regressions show up across commits.
+The tap must be importable, so install it (`pip install -e .`) or set
+`PYTHONPATH` to the repository root, then run
+`python benchmarks/bench_sync.py`.
+"""
+
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import resource
+import subprocess
+import sys
+import time
+import traceback
+
+import fake_purecloud
+
+SYNCS = [
+    'users',
+    'groups',
+    'locations',
+    'presence_definitions',
+    'queues',
+    'management_units',
+    'conversations',
+    'user_details',
+]
+
+DEFAULT_RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl')
+RESULT_POLL_SECONDS = 1
+
+
+class RecordCounter(object):
+    # Stands in for stdout: throws the tap's output away, counting RECORD messages
+    def __init__(self):
+        self.records = 0
+
+    def write(self, text):
+        self.records += text.count('"type": "RECORD"') + text.count('"type":"RECORD"')
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def setup_tap(host, config):
+    import PureCloudPlatformApiSdk
+    import PureCloudPlatformClientV2
+    import tap_purecloud
+
+    tap_purecloud.output.configure(config)
+    tap_purecloud.connections.pools.configure(tap_purecloud.get_http_pool_size(config), True)
+    tap_purecloud.rate_limiter.limiter.configure(config['max_requests_per_second'])
+
+    for sdk in [PureCloudPlatformApiSdk, PureCloudPlatformClientV2]:
+        sdk.configuration.host = host
+        sdk.configuration.access_token = 'benchmark'
+        sdk.configuration.api_client = sdk.ApiClient()
+        tap_purecloud.connections.pools.install(sdk.configuration.api_client.rest_client)
+        tap_purecloud.metrics.run_metrics.install(sdk.configuration.api_client.rest_client)
+        tap_purecloud.rate_limiter.limiter.install(sdk.configuration.api_client.rest_client)
+
+    return tap_purecloud
+
+
+def run_sync(name, host, config, verbose, results):
+    # errors are sent back too, so the parent doesn't wait on a result forever
+    try:
+        results.put(measure_sync(name, host, config, verbose))
+    except Exception:
+        results.put({'error': traceback.format_exc()})
+
+
+def measure_sync(name, host, config, verbose):
+    if not verbose:
+        logging.disable(logging.WARNING)
+
+    tap_purecloud = setup_tap(host, config)
+    sync = getattr(tap_purecloud, 'sync_' + name)
+    args = (config, {}) if name in ('management_units', 'conversations', 'user_details') else (config,)
+
+    counter = RecordCounter()
+    stdout = sys.stdout
+    sys.stdout = counter
+    try:
+        start = time.time()
+        sync(*args)
+        tap_purecloud.output.flush()
+        wall_time = time.time() - start
+    finally:
+        sys.stdout = stdout
+
+    return {
+        'records': counter.records,
+        'wall_time': wall_time,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    }
+
+
+def get_result(name, process, results):
+    while True:
+        try:
+            return results.get(timeout=RESULT_POLL_SECONDS)
+        except queue.Empty:
+            if not process.is_alive():
+                break
+
+    # the result may have arrived just as the process exited
+    try:
+        return results.get(timeout=RESULT_POLL_SECONDS)
+    except queue.Empty:
+        raise RuntimeError("{} sync exited with code {} without a result".format(name, process.exitcode))
+
+
+def measure(fake, name, config, verbose):
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+
+    requests_before = fake.request_count
+    process = context.Process(target=run_sync, args=(name, fake.host, config, verbose, results))
+    process.start()
+    result = get_result(name, process, results)
+    process.join()
+
+    if 'error' in result:
+        raise RuntimeError("{} sync failed:\n{}".format(name, result['error']))
+
+    requests_made = fake.request_count - requests_before
+    result['requests'] = requests_made
+    result['records_per_second'] = result['records'] / result['wall_time']
+    result['requests_per_second'] = requests_made / result['wall_time']
+    return result
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(path, volumes, config):
+    # the last run with the same volumes and tap config, to compare against
+    if not os.path.exists(path):
+        return None
+
+    previous = None
+    with open(path) as f:
+        for line in f:
+            run = json.loads(line)
+            if run['volumes'] == volumes and run['config'] == config:
+                previous = run
+    return previous
+
+
+def format_change(result, previous, key):
+    if previous is None or key not in previous or previous[key] == 0:
+        return ''
+    return ' ({:+.0f}%)'.format(100.0 * (result[key] - previous[key]) / previous[key])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--syncs', nargs='+', choices=SYNCS, default=SYNCS)
+    parser.add_argument('--days', type=int, default=3, help='days of history to sync')
+    parser.add_argument('--latency-ms', type=float, default=0, help='added to every fake API response')
+    parser.add_argument('--config', help='JSON object of extra tap config, e.g. concurrency settings')
+    parser.add_argument('--results', default=DEFAULT_RESULTS_PATH)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--verbose', action='store_true', help='keep the tap\'s INFO logging')
+    for key, value in fake_purecloud.DEFAULT_VOLUMES.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=int, default=value)
+    args = parser.parse_args()
+
+    volumes = {key: getattr(args, key) for key in fake_purecloud.DEFAULT_VOLUMES}
+
+    # the fake API doesn't rate limit, so neither should the tap
+    config = {'max_requests_per_second': 1000}
+    if args.config:
+        config.update(json.loads(args.config))
+
+    tap_config = dict(config)
+    tap_config['start_date'] = datetime.date.today() - datetime.timedelta(days=args.days)
+    tap_config['client_id'] = 'benchmark'
+
+    run = {
+        'commit': get_commit(),
+        'date': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'days': args.days,
+        'latency_ms': args.latency_ms,
+        'volumes': volumes,
+        'config': config,
+        'results': {},
+    }
+    previous = load_previous(args.results, volumes, config)
+
+    fake = fake_purecloud.FakePureCloud(volumes, args.latency_ms / 1000.0).start()
+    try:
+        print("{:<22} {:>9} {:>9} {:>10} {:>10} {:>9} {:>9}".format(
+            'sync', 'records', 'requests', 'records/s', 'requests/s', 'rss MB', 'wall s'))
+
+        for name in args.syncs:
+            result = measure(fake, name, tap_config, args.verbose)
+            run['results'][name] = result
+
+            last = previous['results'].get(name) if previous else None
+            print("{:<22} {:>9} {:>9} {:>10.0f} {:>10.0f} {:>9.1f} {:>9.2f}{}".format(
+                name, result['records'], result['requests'], result['records_per_second'],
+                result['requests_per_second'], result['peak_rss_mb'], result['wall_time'],
+                format_change(result, last, 'wall_time')))
+    finally:
+        fake.stop()
+
+    if not args.no_save:
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(run, sort_keys=True) + '\n')
+        print("Saved results for commit {} to {}".format(run['commit'], args.results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,534 @@
+"""
+A local stand-in for the PureCloud API, serving synthetic users, groups,
+locations, presences, queues, management units, schedules, adherence,
+conversation details (including analytics jobs) and user details at
+configurable volumes. Used by bench_sync.py and the tests; the data is
+generated on request, so volumes can be large.
+"""
+
+import asyncio
+import datetime
+import itertools
+import json
+import re
+import socket
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import websockets
+
+DEFAULT_VOLUMES = {
+    'users': 2000,
+    'groups': 100,
+    'locations': 20,
+    'presences': 10,
+    'queues': 50,
+    'members_per_queue': 40,
+    'wrapup_codes_per_queue': 5,
+    'units': 4,
+    'users_per_unit': 50,
+    'activity_codes': 10,
+    'conversations_per_day': 1000,
+    'user_details_per_day': 500,
+}
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.000Z'
+
+
+def ts(date):
+    return date.strftime(DATETIME_FORMAT)
+
+
+def parse_ts(value):
+    return datetime.datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S')
+
+
+def make_conversation(i, participants, sessions, segments, start=None):
+    if start is None:
+        start = datetime.datetime(2018, 1, 1) + datetime.timedelta(minutes=i)
+
+    def at(minutes):
+        return ts(start + datetime.timedelta(minutes=minutes))
+
+    return {
+        'conversationId': 'conversation-{}-{}'.format(start.strftime('%Y%m%d'), i),
+        'conversationStart': at(0),
+        'conversationEnd': at(30),
+        'participants': [{
+            'participantId': 'participant-{}-{}'.format(i, p),
+            'participantName': 'Participant {}'.format(p),
+            'userId': 'user-{}'.format(p),
+            'purpose': 'agent',
+            'sessions': [{
+                'mediaType': 'voice',
+                'sessionId': 'session-{}-{}-{}'.format(i, p, s),
+                'ani': 'tel:+15555550100',
+                'direction': 'inbound',
+                'dnis': 'tel:+15555550199',
+                'segments': [{
+                    'segmentStart': at(g),
+                    'segmentEnd': at(g + 1),
+                    'queueId': 'queue-1',
+                    'segmentType': 'interact',
+                    'disconnectType': 'client',
+                    'requestedRoutingSkillIds': ['skill-1', 'skill-2'],
+                    'sipResponseCodes': [200],
+                    'conference': False,
+                } for g in range(segments)],
+            } for s in range(sessions)],
+        } for p in range(participants)],
+    }
+
+
+def make_user(i):
+    return {
+        'id': 'user-{}'.format(i),
+        'name': 'User {}'.format(i),
+        'email': 'user{}@example.com'.format(i),
+        'username': 'user{}@example.com'.format(i),
+        'state': 'active',
+        'title': 'Agent',
+        'department': 'Support',
+        'version': 1,
+        'locations': [{'id': 'location-{}'.format(i % 20)}],
+        'selfUri': '/api/v2/users/user-{}'.format(i),
+    }
+
+
+def make_group(i):
+    return {
+        'id': 'group-{}'.format(i),
+        'name': 'Group {}'.format(i),
+        'description': 'Synthetic group',
+        'dateModified': '2018-01-01T00:00:00.000Z',
+        'memberCount': 10,
+        'state': 'active',
+        'type': 'official',
+        'version': 1,
+    }
+
+
+def make_location(i):
+    return {
+        'id': 'location-{}'.format(i),
+        'name': 'Location {}'.format(i),
+        'address': {'city': 'Indianapolis', 'country': 'US'},
+        'state': 'active',
+        'version': 1,
+    }
+
+
+def make_presence(i):
+    return {
+        'id': 'presence-{}'.format(i),
+        'name': 'Presence {}'.format(i),
+        'systemPresence': 'Available',
+        'deactivated': False,
+        'primary': i == 0,
+        'createdDate': '2018-01-01T00:00:00.000Z',
+    }
+
+
+def make_queue(i):
+    return {
+        'id': 'queue-{}'.format(i),
+        'name': 'Queue {}'.format(i),
+        'description': 'Synthetic queue',
+        'dateCreated': '2018-01-01T00:00:00.000Z',
+        'dateModified': '2018-01-01T00:00:00.000Z',
+        'state': 'active',
+        'memberCount': 40,
+    }
+
+
+def make_queue_member(queue, i):
+    return {
+        'id': 'user-{}'.format(i),
+        'name': 'User {}'.format(i),
+        'user': {'id': 'user-{}'.format(i)},
+        'ringNumber': 1,
+        'joined': True,
+        'memberBy': 'user',
+    }
+
+
+def make_wrapup_code(queue, i):
+    return {
+        'id': 'wrapup-{}'.format(i),
+        'name': 'Wrapup {}'.format(i),
+        'dateCreated': '2018-01-01T00:00:00.000Z',
+    }
+
+
+def make_unit(i):
+    return {
+        'id': 'unit-{}'.format(i),
+        'name': 'Unit {}'.format(i),
+        'startDayOfWeek': 'Monday',
+        'timezone': 'UTC',
+        'version': 1,
+    }
+
+
+def make_activity_code(i):
+    return {
+        'name': 'Activity {}'.format(i),
+        'isActive': True,
+        'isDefault': False,
+        'category': 'OnQueueWork',
+        'lengthInMinutes': 30,
+        'countsAsPaidTime': True,
+        'countsAsWorkTime': True,
+    }
+
+
+def make_shift(day):
+    start = day + datetime.timedelta(hours=9)
+    return {
+        'startDate': ts(start),
+        'lengthInMinutes': 480,
+        'activities': [{
+            'activityCodeId': str(a),
+            'startDate': ts(start + datetime.timedelta(hours=2 * a)),
+            'lengthInMinutes': 120,
+            'description': 'Activity {}'.format(a),
+            'countsAsPaidTime': True,
+            'isDstFallback': False,
+        } for a in range(4)],
+    }
+
+
+def make_adherence(user_id, start, end):
+    days = max(1, (end - start).days)
+    return {
+        'userId': user_id,
+        'startDate': ts(start),
+        'endDate': ts(end),
+        'adherencePercentage': 95.0,
+        'conformancePercentage': 98.0,
+        'impact': 'Positive',
+        'exceptionInfo': [{
+            'startOffsetSeconds': day * 86400 + 3600,
+            'endOffsetSeconds': day * 86400 + 3900,
+            'scheduledActivityCodeId': '0',
+            'actualActivityCategory': 'Break',
+            'impact': 'Negative',
+        } for day in range(days)],
+        'dayMetrics': [{
+            'dayStartOffsetSecs': day * 86400,
+            'adherenceScheduleSecs': 27000,
+            'conformanceScheduleSecs': 28800,
+            'conformanceActualSecs': 28000,
+            'exceptionCount': 1,
+            'exceptionDurationSecs': 300,
+            'impactSeconds': 100,
+            'scheduleLengthSecs': 28800,
+            'actualLengthSecs': 28500,
+        } for day in range(days)],
+    }
+
+
+def make_user_detail(i, start):
+    return {
+        'userId': 'user-{}'.format(i),
+        'primaryPresence': [{
+            'startTime': ts(start + datetime.timedelta(hours=h)),
+            'endTime': ts(start + datetime.timedelta(hours=h + 1)),
+            'systemPresence': 'AVAILABLE',
+            'organizationPresenceId': 'presence-0',
+        } for h in range(4)],
+        'routingStatus': [{
+            'startTime': ts(start + datetime.timedelta(hours=h)),
+            'endTime': ts(start + datetime.timedelta(hours=h + 1)),
+            'routingStatus': 'IDLE',
+        } for h in range(4)],
+    }
+
+
+def page_of(items, page_size, page_number):
+    start = (page_number - 1) * page_size
+    return items[start:start + page_size]
+
+
+def entity_listing(count, make, page_size, page_number, entity_name='entities'):
+    first = (page_number - 1) * page_size
+    entities = [make(i) for i in range(first, min(count, first + page_size))]
+    return {
+        entity_name: entities,
+        'pageSize': page_size,
+        'pageNumber': page_number,
+        'total': count,
+        'pageCount': (count + page_size - 1) // page_size,
+    }
+
+
+def analytics_page(interval, per_day, page_size, page_number, make):
+    # spreads per_day items evenly over every day the interval covers
+    start, end = [parse_ts(part) for part in interval.split('/')]
+    items = []
+    day = datetime.datetime.combine(start.date(), datetime.time())
+    while day < end:
+        for i in range(per_day):
+            item_time = day + datetime.timedelta(seconds=i * 86400 // per_day)
+            if start <= item_time < end:
+                items.append((i, item_time))
+        day += datetime.timedelta(days=1)
+
+    return [make(i, item_time) for (i, item_time) in page_of(items, page_size, page_number)]
+
+
+class FakePureCloud(object):
+    # Serves the API on a local port from a background thread. latency is
+    # added to every response to stand in for the network.
+    def __init__(self, volumes=None, latency=0.0):
+        self.volumes = dict(DEFAULT_VOLUMES)
+        self.volumes.update(volumes or {})
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.adherence_queries = {}
+        self.query_ids = itertools.count()
+        self.channel_ids = itertools.count(1)
+
+        # conversation details jobs finish after job_polls status checks, in
+        # job_final_state; the jobs API has data up to jobs_available_until
+        # (today if None)
+        self.jobs = {}
+        self.job_ids = itertools.count()
+        self.job_polls = 1
+        self.job_final_state = 'FULFILLED'
+        self.jobs_available_until = None
+
+        fake = self
+
+        class Handler(FakePureCloudHandler):
+            server_fake = fake
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.host = 'http://127.0.0.1:{}'.format(self.server.server_port)
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.start_websocket()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.loop.call_soon_threadsafe(self.websocket_stop.set_result, None)
+        self.websocket_thread.join()
+
+    def start_websocket(self):
+        # the tap keeps a notification channel open while syncing management
+        # units; adherence downloads are handed out directly, so nothing is
+        # sent on it unless a test calls notify()
+        started = threading.Event()
+        self.websockets = set()
+
+        async def handler(websocket, *args):
+            self.websockets.add(websocket)
+            try:
+                await websocket.wait_closed()
+            finally:
+                self.websockets.discard(websocket)
+
+        async def serve():
+            self.websocket_stop = self.loop.create_future()
+            server = await websockets.serve(handler, '127.0.0.1', 0)
+            self.websocket_uri = 'ws://127.0.0.1:{}'.format(server.sockets[0].getsockname()[1])
+            started.set()
+            await self.websocket_stop
+            server.close()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.loop.run_until_complete(serve())
+
+        self.loop = asyncio.new_event_loop()
+        self.websocket_thread = threading.Thread(target=run, daemon=True)
+        self.websocket_thread.start()
+        started.wait()
+
+    def notify(self, body):
+        # sends a notification to every connected channel
+        async def send():
+            for websocket in list(self.websockets):
+                await websocket.send(json.dumps({'topicName': 'fake', 'eventBody': body}))
+        asyncio.run_coroutine_threadsafe(send(), self.loop).result()
+
+    def drop_websockets(self):
+        async def close():
+            for websocket in list(self.websockets):
+                await websocket.close(code=1011)
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+
+    def count_request(self):
+        with self.lock:
+            self.request_count += 1
+
+    def get(self, path, query):
+        v = self.volumes
+        page_size = int(query.get('pageSize', 25))
+        page_number = int(query.get('pageNumber', 1))
+
+        if path == '/api/v2/users':
+            return entity_listing(v['users'], make_user, page_size, page_number)
+        elif path == '/api/v2/groups':
+            return entity_listing(v['groups'], make_group, page_size, page_number)
+        elif path == '/api/v2/presencedefinitions':
+            return entity_listing(v['presences'], make_presence, page_size, page_number)
+        elif path == '/api/v2/routing/queues':
+            return entity_listing(v['queues'], make_queue, page_size, page_number)
+        elif path == '/api/v2/workforcemanagement/managementunits':
+            return {'entities': [make_unit(i) for i in range(v['units'])]}
+
+        match = re.match(r'^/api/v2/routing/queues/([^/]+)/(users|wrapupcodes)$', path)
+        if match:
+            queue, kind = match.groups()
+            if kind == 'users':
+                return entity_listing(v['members_per_queue'], lambda i: make_queue_member(queue, i), page_size, page_number)
+            return entity_listing(v['wrapup_codes_per_queue'], lambda i: make_wrapup_code(queue, i), page_size, page_number)
+
+        match = re.match(r'^/api/v2/workforcemanagement/managementunits/unit-(\d+)/(activitycodes|users)$', path)
+        if match:
+            unit, kind = int(match.group(1)), match.group(2)
+            if kind == 'activitycodes':
+                return {'activityCodes': {str(i): make_activity_code(i) for i in range(v['activity_codes'])}}
+            first = unit * v['users_per_unit']
+            return {'entities': [{'id': 'user-{}'.format(first + i)} for i in range(v['users_per_unit'])]}
+
+        if path == '/api/v2/analytics/conversations/details/jobs/availability':
+            available = self.jobs_available_until or datetime.datetime.combine(datetime.date.today(), datetime.time())
+            return {'dataAvailabilityDate': ts(available)}
+
+        match = re.match(r'^/api/v2/analytics/conversations/details/jobs/([^/]+)$', path)
+        if match:
+            with self.lock:
+                job = self.jobs.get(match.group(1))
+                if job is None:
+                    return None
+                job['polls'] += 1
+                state = self.job_final_state if job['polls'] >= self.job_polls else 'PENDING'
+
+            status = {'state': state}
+            if state == 'FAILED':
+                status['errorMessage'] = 'Failed in fake API'
+            return status
+
+        match = re.match(r'^/api/v2/analytics/conversations/details/jobs/([^/]+)/results$', path)
+        if match:
+            with self.lock:
+                job = self.jobs.get(match.group(1))
+            if job is None:
+                return None
+
+            # the cursor is just the next page number
+            page_number = int(query.get('cursor', 1))
+            make = lambda i, start: make_conversation(i, 3, 2, 4, start)
+            conversations = analytics_page(job['interval'], v['conversations_per_day'], page_size, page_number, make)
+            results = {'conversations': conversations}
+            if len(analytics_page(job['interval'], v['conversations_per_day'], page_size, page_number + 1, lambda i, start: i)) > 0:
+                results['cursor'] = str(page_number + 1)
+            return results
+
+        match = re.match(r'^/downloads/adherence/([^/]+)$', path)
+        if match:
+            with self.lock:
+                query = self.adherence_queries.pop(match.group(1), None)
+            if query is None:
+                return None
+            start, end, user_ids = query
+            return {'data': [make_adherence(user_id, start, end) for user_id in user_ids]}
+
+        return None
+
+    def post(self, path, query, body):
+        v = self.volumes
+
+        if path == '/api/v2/locations/search':
+            return entity_listing(v['locations'], make_location, body.get('pageSize', 25), body.get('pageNumber', 1), 'results')
+        elif path == '/api/v2/notifications/channels':
+            return {'id': 'channel-{}'.format(next(self.channel_ids)), 'connectUri': self.websocket_uri}
+        elif re.match(r'^/api/v2/notifications/channels/[^/]+/subscriptions$', path):
+            return {'entities': body}
+        elif path == '/api/v2/analytics/conversations/details/query':
+            paging = body['paging']
+            make = lambda i, start: make_conversation(i, 3, 2, 4, start)
+            return {'conversations': analytics_page(body['interval'], v['conversations_per_day'], paging['pageSize'], paging['pageNumber'], make)}
+        elif path == '/api/v2/analytics/conversations/details/jobs':
+            job_id = 'job-{}'.format(next(self.job_ids))
+            with self.lock:
+                self.jobs[job_id] = {'interval': body['interval'], 'polls': 0}
+            return {'jobId': job_id}
+        elif path == '/api/v2/analytics/users/details/query':
+            paging = body['paging']
+            return {'userDetails': analytics_page(body['interval'], v['user_details_per_day'], paging['pageSize'], paging['pageNumber'], make_user_detail)}
+
+        match = re.match(r'^/api/v2/workforcemanagement/managementunits/([^/]+)/schedules/search$', path)
+        if match:
+            start, end = parse_ts(body['startDate']), parse_ts(body['endDate'])
+            days = [start + datetime.timedelta(days=d) for d in range((end - start).days)]
+            return {'userSchedules': {
+                user_id: {'shifts': [make_shift(day) for day in days], 'fullDayTimeOffMarkers': []}
+                for user_id in body['userIds']
+            }}
+
+        match = re.match(r'^/api/v2/workforcemanagement/managementunits/([^/]+)/historicaladherencequery$', path)
+        if match:
+            query_id = 'adherence-{}'.format(next(self.query_ids))
+            with self.lock:
+                self.adherence_queries[query_id] = (parse_ts(body['startDate']), parse_ts(body['endDate']), body['userIds'])
+            return {
+                'id': query_id,
+                'queryState': 'Complete',
+                'downloadUrl': '{}/downloads/adherence/{}'.format(self.host, query_id),
+            }
+
+        return None
+
+
+class FakePureCloudHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_fake = None
+
+    def setup(self):
+        super(FakePureCloudHandler, self).setup()
+        # headers and body go out in separate writes; don't let Nagle hold the body back
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, data):
+        if self.server_fake.latency > 0:
+            time.sleep(self.server_fake.latency)
+
+        if data is None:
+            self.send_response(404)
+            body = b'{"status": 404, "message": "Not found in fake API"}'
+        else:
+            self.send_response(200)
+            body = json.dumps(data).encode('utf-8')
+
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def parse(self):
+        self.server_fake.count_request()
+        url = urllib.parse.urlparse(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        return url.path, query
+
+    def do_GET(self):
+        path, query = self.parse()
+        self.respond(self.server_fake.get(path, query))
+
+    def do_POST(self):
+        path, query = self.parse()
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length)) if length > 0 else {}
+        self.respond(self.server_fake.post(path, query, body))
@@ -1,7 +1,6 @@
 #!/usr/bin/env python3
 
 import argparse
-import requests
 import singer
 import logging
 import base64
@@ -9,14 +8,28 @@ import datetime
 import time
 import json
 import backoff
+import dateutil.parser
 import hashlib
 import collections
+import copy
+import functools
+import threading
 
 import PureCloudPlatformApiSdk
 import PureCloudPlatformClientV2
 from PureCloudPlatformApiSdk.rest import ApiException
 
+import tap_purecloud.connections as connections
+import tap_purecloud.converters as converters
+import tap_purecloud.fingerprints as fingerprints
+import tap_purecloud.json_stream as json_stream
+import tap_purecloud.metrics as metrics
+import tap_purecloud.output as output
+import tap_purecloud.page_sizes as page_sizes
+import tap_purecloud.rate_limiter as rate_limiter
 import tap_purecloud.schemas as schemas
+import tap_purecloud.scheduler as scheduler
+import tap_purecloud.token_manager as token_manager
 import tap_purecloud.websocket_helper
 import time
 
@@ -25,11 +38,41 @@ logger = singer.get_logger()
 
 HTTP_SUCCESS = 200
 HTTP_RATE_LIMIT_ERROR = 429
-API_RETRY_INTERVAL_SECONDS = 30
 API_RETRY_COUNT = 5
 BASE_PURECLOUD_AUTH_HOST = 'https://login.{domain}'
 BASE_PURECLOUD_API_HOST = 'https://api.{domain}'
 DEFAULT_SCHEDULE_LOOKAHEAD_WEEKS = 5
+DEFAULT_SCHEDULE_QUERY_DAYS = 7
+DEFAULT_USER_CHUNK_SIZE = 100
+CONVERSATION_DETAILS_PATH = '/api/v2/analytics/conversations/details/query'
+USER_DETAILS_PATH = '/api/v2/analytics/users/details/query'
+CONVERSATION_JOBS_PATH = '/api/v2/analytics/conversations/details/jobs'
+CONVERSATION_JOB_PATH = '/api/v2/analytics/conversations/details/jobs/{jobId}'
+CONVERSATION_JOB_RESULTS_PATH = '/api/v2/analytics/conversations/details/jobs/{jobId}/results'
+CONVERSATION_JOBS_AVAILABILITY_PATH = '/api/v2/analytics/conversations/details/jobs/availability'
+CONVERSATION_JOB_WINDOW_DAYS = 7
+CONVERSATION_JOB_PAGE_SIZE = 1000
+CONVERSATION_JOB_POLL_SECONDS = 15
+CONVERSATION_JOB_TIMEOUT_SECONDS = 2 * 60 * 60
+CONVERSATION_JOB_FAILED_STATES = {'FAILED', 'CANCELLED', 'EXPIRED'}
+DEFAULT_MAX_CONCURRENT_WINDOWS = 1
+DEFAULT_MAX_CONCURRENT_STREAMS = 1
+DEFAULT_MAX_CONCURRENT_REQUESTS = 1
+DEFAULT_MAX_CONCURRENT_UNITS = 1
+DEFAULT_WINDOW_TARGET_PAGES = 10
+DEFAULT_MAX_WINDOW_DAYS = 7
+DEFAULT_PREFETCH_PAGES = 0
+DEFAULT_MAX_CONCURRENT_PAGES = 1
+DEFAULT_ADHERENCE_QUERY_DAYS = 1
+MAX_ADHERENCE_QUERY_DAYS = 31
+ADHERENCE_QUERY_ATTEMPTS = 3
+SECONDS_PER_DAY = 24 * 60 * 60
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_BATCH_SIZE = 500
+BOOKMARK_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+STATE_LOCK = threading.RLock()
+THREAD_API_CLIENTS = threading.local()
 
 
 def giveup(error):
@@ -46,8 +89,8 @@ def giveup(error):
     return not should_retry
 
 
-def get_access_token(config):
-    "Returns an access_token for the client credentials, or raises if unauthorized"
+def request_access_token(config):
+    "Returns the token response (access_token, expires_in) for the client credentials, or raises if unauthorized"
 
     client_id = config['client_id']
     client_secret = config['client_secret']
@@ -67,11 +110,10 @@ def get_access_token(config):
         'Content-Type': 'application/x-www-form-urlencoded'
     }
 
-    response = requests.post(auth_endpoint, data=body, headers=headers)
+    response = connections.pools.session.post(auth_endpoint, data=body, headers=headers)
 
     if response.status_code == HTTP_SUCCESS:
-        response_json = response.json()
-        return response_json['access_token']
+        return response.json()
     else:
         logger.fatal(response.json())
         raise RuntimeError("Unauthorized")
@@ -83,13 +125,16 @@ class FakeBody(object):
         self.page_size = page_size
 
 
-@backoff.on_exception(backoff.constant,
-                      (PureCloudPlatformApiSdk.rest.ApiException),
-                      jitter=backoff.random_jitter,
-                      max_tries=API_RETRY_COUNT,
-                      giveup=giveup,
-                      interval=API_RETRY_INTERVAL_SECONDS)
+retry_api_call = backoff.on_exception(rate_limiter.retry_wait,
+                                      (PureCloudPlatformApiSdk.rest.ApiException),
+                                      jitter=backoff.random_jitter,
+                                      max_tries=API_RETRY_COUNT,
+                                      giveup=giveup,
+                                      on_backoff=metrics.run_metrics.observe_retry,
+                                      limiter=rate_limiter.limiter)
 
+
+@retry_api_call
 def fetch_one_page(get_records, body, entity_name, api_function_params):
     if isinstance(body, FakeBody):
         logger.info("Fetching {} records from page {}".format(body.page_size, body.page_number))
@@ -127,37 +172,90 @@ def should_continue(api_response, body, entity_name):
         return True
 
 
-def fetch_all_records(get_records, entity_name, body, api_function_params=None, max_pages=None):
+def get_page_size(tuner):
+    if tuner is None:
+        return page_sizes.DEFAULT_PAGE_SIZE
+    return tuner.size
+
+
+def observe_page_size(tuner, page_size, results):
+    if tuner is not None:
+        tuner.observe(page_size, metrics.run_metrics.last_request_seconds(), len(results))
+
+
+def fetch_all_records(get_records, entity_name, body, api_function_params=None, max_pages=None, prefetch=0, max_workers=1, tuner=None):
+    pages = iter_all_records(get_records, entity_name, body, api_function_params, max_pages, max_workers, tuner)
+    if prefetch > 0:
+        pages = scheduler.prefetch(pages, prefetch)
+    return pages
+
+
+def iter_all_records(get_records, entity_name, body, api_function_params=None, max_pages=None, max_workers=1, tuner=None):
     if api_function_params is None:
         api_function_params = {}
 
-    body.page_size = 100
+    # page numbers depend on the page size, so it stays fixed for this run
+    body.page_size = get_page_size(tuner)
     body.page_number = 1
 
     api_response, results = fetch_one_page(get_records, body, entity_name, api_function_params)
+    observe_page_size(tuner, body.page_size, results)
     yield results
 
+    page_count = getattr(api_response, 'page_count', None)
+    if max_workers > 1 and page_count is not None:
+        if should_continue(api_response, body, entity_name):
+            for results in iter_remaining_pages(get_records, entity_name, body, api_function_params, page_count, max_pages, max_workers, tuner):
+                yield results
+        return
+
     while should_continue(api_response, body, entity_name) and body.page_number != max_pages:
         body.page_number += 1
 
         api_response, results = fetch_one_page(get_records, body, entity_name, api_function_params)
+        observe_page_size(tuner, body.page_size, results)
         yield results
 
 
-def fetch_all_analytics_records(get_records, body, entity_name, max_pages=None):
+def iter_remaining_pages(get_records, entity_name, body, api_function_params, page_count, max_pages, max_workers, tuner=None):
+    # the first page told us how many pages there are, so fetch the rest
+    # concurrently and hand them back in page order
+    last_page = page_count if max_pages is None else min(page_count, max_pages)
+
+    def fetch_page(page_number):
+        page_body = copy.copy(body)
+        page_body.page_number = page_number
+        _, results = fetch_one_page(get_records, page_body, entity_name, api_function_params)
+        observe_page_size(tuner, page_body.page_size, results)
+        return results
+
+    for _, results in scheduler.ordered_map(fetch_page, range(2, last_page + 1), max_workers):
+        yield results
+
+
+def fetch_all_analytics_records(get_records, body, entity_name, max_pages=None, prefetch=0, tuner=None):
+    pages = iter_all_analytics_records(get_records, body, entity_name, max_pages, tuner)
+    if prefetch > 0:
+        pages = scheduler.prefetch(pages, prefetch)
+    return pages
+
+
+def iter_all_analytics_records(get_records, body, entity_name, max_pages=None, tuner=None):
     api_function_params = {}
 
     body.paging = {
-        "pageSize": 100,
+        "pageSize": get_page_size(tuner),
         "pageNumber": 1
     }
 
     api_response, results = fetch_one_page(get_records, body, entity_name, api_function_params)
+    observe_page_size(tuner, body.paging['pageSize'], results)
     yield results
 
     while results is not None and len(results) > 0 and body.paging['pageNumber'] != max_pages:
         body.paging['pageNumber'] += 1
         api_response, results = fetch_one_page(get_records, body, entity_name, api_function_params)
+        observe_page_size(tuner, body.paging['pageSize'], results)
         yield results
 
 
@@ -170,87 +268,155 @@ def parse_dates(record):
 
 
 def handle_object(obj):
-    return parse_dates(obj.to_dict())
+    return converters.convert(obj)
 
 
-def stream_results(generator, transform_record, record_name, schema, primary_key, write_schema):
-    all_records = []
+def iter_stream_results(generator, transform_record, record_name, schema, primary_key, write_schema, fingerprint_store=None, fingerprint_key=None):
     if write_schema:
-        singer.write_schema(record_name, schema, primary_key)
-    for page in generator:
-        if isinstance(page, dict):
-            records = [transform_record(k, v) for (k,v) in page.items()]
-        else:
-            records = [transform_record(record) for record in page]
-        valid_records = [r for r in records if r is not None]
-        singer.write_records(record_name, valid_records)
-        all_records.extend(valid_records)
-    return all_records
+        output.write_schema(record_name, schema, primary_key)
+
+    with singer.metrics.record_counter(record_name) as counter:
+        for page in metrics.run_metrics.timed_pages(record_name, generator):
+            start = time.time()
+            if isinstance(page, dict):
+                records = [transform_record(k, v) for (k,v) in page.items()]
+            else:
+                records = [transform_record(record) for record in page]
+            valid_records = [r for r in records if r is not None]
+
+            if fingerprint_store is not None:
+                records = fingerprint_store.filter_changed(record_name, fingerprint_key or primary_key, valid_records)
+            else:
+                records = valid_records
+
+            transformed = time.time()
+            output.write_records(record_name, records)
+
+            counter.increment(len(records))
+            metrics.run_metrics.observe_page(record_name, len(records), transformed - start, time.time() - transformed)
+
+            yield valid_records
+
+
+def stream_results(generator, transform_record, record_name, schema, primary_key, write_schema, fingerprint_store=None, key=None, fingerprint_key=None):
+    # Records are written page by page and then dropped, so memory stays
+    # flat however many there are. Callers that fan out over the records
+    # pass `key` to get back just that value from each one.
+    values = []
+    for records in iter_stream_results(generator, transform_record, record_name, schema, primary_key, write_schema, fingerprint_store, fingerprint_key):
+        if key is not None:
+            values.extend(record[key] for record in records)
+
+    if key is not None:
+        return values
 
 
 def stream_results_list(generator, transform_record, record_name, schema, primary_key, write_schema):
     if write_schema:
-        singer.write_schema(record_name, schema, primary_key)
+        output.write_schema(record_name, schema, primary_key)
+
+    with singer.metrics.record_counter(record_name) as counter:
+        for page in metrics.run_metrics.timed_pages(record_name, generator):
+            start = time.time()
+            records = [record for records in page for record in transform_record(records)]
+
+            transformed = time.time()
+            output.write_records(record_name, records)
 
-    for page in generator:
-        records_list = [transform_record(record) for record in page]
-        for records in records_list:
-            singer.write_records(record_name, records)
+            counter.increment(len(records))
+            metrics.run_metrics.observe_page(record_name, len(records), transformed - start, time.time() - transformed)
 
 
-def sync_users(config):
+def sync_users(config, fingerprint_store=None):
     logger.info("Fetching users")
     api_instance = PureCloudPlatformApiSdk.UsersApi()
+    prefetch = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
+    max_workers = config.get('max_concurrent_pages', DEFAULT_MAX_CONCURRENT_PAGES)
     body = FakeBody()
-    gen_users = fetch_all_records(api_instance.get_users, 'entities', body, {'expand': ['locations']})
-    stream_results(gen_users, handle_object, 'users', schemas.user, ['id'], True)
+    gen_users = fetch_all_records(api_instance.get_users, 'entities', body, {'expand': ['locations']}, prefetch=prefetch, max_workers=max_workers, tuner=page_sizes.get_tuner(config, 'users'))
+    stream_results(gen_users, handle_object, 'users', schemas.user, ['id'], True, fingerprint_store)
 
 
-def sync_groups(config):
+def sync_groups(config, fingerprint_store=None):
     logger.info("Fetching groups")
     api_instance = PureCloudPlatformApiSdk.GroupsApi()
+    prefetch = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
+    max_workers = config.get('max_concurrent_pages', DEFAULT_MAX_CONCURRENT_PAGES)
     body = FakeBody()
-    gen_groups = fetch_all_records(api_instance.get_groups, 'entities', body)
-    stream_results(gen_groups, handle_object, 'groups', schemas.group, ['id'], True)
+    gen_groups = fetch_all_records(api_instance.get_groups, 'entities', body, prefetch=prefetch, max_workers=max_workers, tuner=page_sizes.get_tuner(config, 'groups'))
+    stream_results(gen_groups, handle_object, 'groups', schemas.group, ['id'], True, fingerprint_store)
 
 
-def sync_locations(config):
+def sync_locations(config, fingerprint_store=None):
     logger.info("Fetching locations")
     api_instance = PureCloudPlatformApiSdk.LocationsApi()
+    prefetch = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
     body = PureCloudPlatformApiSdk.LocationSearchRequest()
-    gen_locations = fetch_all_records(api_instance.post_search, 'results', body)
-    stream_results(gen_locations, handle_object, 'location', schemas.location, ['id'], True)
+    gen_locations = fetch_all_records(api_instance.post_search, 'results', body, prefetch=prefetch, tuner=page_sizes.get_tuner(config, 'location'))
+    stream_results(gen_locations, handle_object, 'location', schemas.location, ['id'], True, fingerprint_store)
 
 
-def sync_presence_definitions(config):
+def sync_presence_definitions(config, fingerprint_store=None):
     logger.info("Fetching presence definitions")
     api_instance = PureCloudPlatformApiSdk.PresenceApi()
+    prefetch = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
+    max_workers = config.get('max_concurrent_pages', DEFAULT_MAX_CONCURRENT_PAGES)
     body = FakeBody()
-    gen_presences = fetch_all_records(api_instance.get_presencedefinitions, 'entities', body)
-    stream_results(gen_presences, handle_object, 'presence', schemas.presence, ['id'], True)
+    gen_presences = fetch_all_records(api_instance.get_presencedefinitions, 'entities', body, prefetch=prefetch, max_workers=max_workers, tuner=page_sizes.get_tuner(config, 'presence'))
+    stream_results(gen_presences, handle_object, 'presence', schemas.presence, ['id'], True, fingerprint_store)
 
 
-def sync_queues(config):
+def sync_queues(config, fingerprint_store=None):
     logger.info("Fetching queues")
     api_instance = PureCloudPlatformApiSdk.RoutingApi()
+    prefetch = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
+    max_workers = config.get('max_concurrent_pages', DEFAULT_MAX_CONCURRENT_PAGES)
     body = FakeBody()
-    gen_queues = fetch_all_records(api_instance.get_queues, 'entities', body)
+    gen_queues = fetch_all_records(api_instance.get_queues, 'entities', body, prefetch=prefetch, max_workers=max_workers, tuner=page_sizes.get_tuner(config, 'queues'))
 
-    queues = stream_results(gen_queues, handle_object, 'queues', schemas.queue, ['id'], True)
+    # queue children are fetched as soon as each page of queues is written
+    queue_pages = iter_stream_results(gen_queues, handle_object, 'queues', schemas.queue, ['id'], True, fingerprint_store)
+    queue_ids = (queue['id'] for queues in queue_pages for queue in queues)
 
-    for i, queue in enumerate(queues):
+    def fetch_queue_children(queue_id):
+        start = time.time()
+
+        getter = lambda page_size, page_number, **kwargs: api_instance.get_queues_queue_id_users(queue_id, page_size=page_size, page_number=page_number)
+        queue_membership = list(fetch_all_records(getter, 'entities', FakeBody(), tuner=page_sizes.get_tuner(config, 'queue_membership')))
+
+        getter = get_wrapupcodes_for_broken_sdk(api_instance, queue_id)
+        queue_wrapup_codes = list(fetch_all_records(getter, 'entities', FakeBody(), tuner=page_sizes.get_tuner(config, 'queue_wrapup_code')))
+
+        logger.info("Fetched membership and wrapup codes for queue {} in {:.2f}s".format(queue_id, time.time() - start))
+        return queue_membership, queue_wrapup_codes
+
+    max_concurrent_requests = config.get('max_concurrent_requests', DEFAULT_MAX_CONCURRENT_REQUESTS)
+    children = scheduler.ordered_map(fetch_queue_children, queue_ids, max_concurrent_requests)
+
+    for i, (queue_id, (queue_membership, queue_wrapup_codes)) in enumerate(children):
         first_page = (i == 0)
-        queue_id = queue['id']
 
-        getter = lambda *args, **kwargs: api_instance.get_queues_queue_id_users(queue_id)
-        gen_queue_membership = fetch_all_records(getter, 'entities', FakeBody())
-        stream_results(gen_queue_membership, handle_queue_user_membership(queue_id), 'queue_membership', schemas.queue_membership, ['id'], first_page)
+        # the same user or wrapup code shows up under several queues, so
+        # their fingerprints are kept per queue
+        stream_results(queue_membership, handle_queue_user_membership(queue_id), 'queue_membership', schemas.queue_membership, ['id'], first_page, fingerprint_store, fingerprint_key=['queue_id', 'id'])
+        stream_results(queue_wrapup_codes, handle_queue_wrapup_code(queue_id), 'queue_wrapup_code', schemas.queue_wrapup, ['id'], first_page, fingerprint_store, fingerprint_key=['queue_id', 'id'])
+
 
-        getter = lambda *args, **kwargs: api_instance.get_queues_queue_id_wrapupcodes(queue_id)
-        gen_queue_wrapup_codes = fetch_all_records(getter, 'entities', FakeBody())
-        stream_results(gen_queue_wrapup_codes, handle_queue_wrapup_code(queue_id), 'queue_wrapup_code', schemas.queue_wrapup, ['id'], first_page)
+def new_api_client(sdk):
+    # a separate client has its own last_response, but shares the
+    # configured (rate limited) connection pool with the default client
+    api_client = sdk.ApiClient()
+    if sdk.configuration.api_client is not None:
+        api_client.rest_client = sdk.configuration.api_client.rest_client
+    return api_client
 
 
+def get_thread_api_client(sdk):
+    api_clients = THREAD_API_CLIENTS.__dict__
+    if sdk.__name__ not in api_clients:
+        api_clients[sdk.__name__] = new_api_client(sdk)
+    return api_clients[sdk.__name__]
+
 
 def get_wfm_units_for_broken_sdk(api_instance):
     def wrap(*args, **kwargs):
@@ -259,6 +425,23 @@ def get_wfm_units_for_broken_sdk(api_instance):
     return wrap
 
 
+def get_wrapupcodes_for_broken_sdk(api_instance, queue_id):
+    # the SDK's get_queues_queue_id_wrapupcodes doesn't take the paging
+    # parameters, so every page would come back as the first one
+    def wrap(page_size, page_number, **kwargs):
+        return api_instance.api_client.call_api(
+            '/api/v2/routing/queues/{queueId}/wrapupcodes', 'GET',
+            {'queueId': queue_id},
+            {'pageSize': page_size, 'pageNumber': page_number},
+            {'Accept': 'application/json', 'Content-Type': 'application/json'},
+            body=None,
+            post_params=[],
+            files={},
+            response_type='WrapupCodeEntityListing',
+            auth_settings=['PureCloud Auth'])
+    return wrap
+
+
 def handle_activity_codes(unit_id):
     def wrap(activity_code_id, activity_code):
         activity_code = activity_code.to_dict()
@@ -295,26 +478,53 @@ def handle_queue_wrapup_code(queue_id):
         return wrapup_code
     return wrap
 
-def handle_schedule(start_date):
-    def wrap(user_id, user_record):
-        schedule = {
-            'start_date': start_date,
-            'user_id': user_id
-        }
+def handle_shift(shift_record):
+    shift = parse_dates(shift_record.to_dict())
+    shift['activities'] = [parse_dates(activity) for activity in shift['activities']]
+    return shift
+
+
+def get_shift_day(shift_record):
+    start_date = shift_record.start_date
+    if start_date.tzinfo is not None:
+        start_date = start_date.astimezone(datetime.timezone.utc)
+    return start_date.date()
 
-        if len(user_record.shifts) == 0:
-            return None
 
-        shifts = [parse_dates(shift.to_dict()) for shift in user_record.shifts]
-        for shift in shifts:
-            parsed_activities = [parse_dates(activity) for activity in shift['activities']]
-            shift['activities'] = parsed_activities
+def handle_schedule_days(start_date, end_date):
+    # A range query returns each user's shifts for the whole range. Group
+    # them by the day they start on, giving the same one record per user
+    # and day that a single day query returned. Shifts starting outside
+    # the range belong to a neighbouring range's query.
+    def wrap(user_schedule):
+        user_id, user_record = user_schedule
 
-        schedule['shifts'] = shifts
-        return schedule
+        shifts_by_day = collections.OrderedDict()
+        for shift_record in user_record.shifts:
+            day = get_shift_day(shift_record)
+            if start_date <= day < end_date:
+                shifts_by_day.setdefault(day, []).append(handle_shift(shift_record))
+
+        return [{
+            'start_date': day.strftime('%Y-%m-%dT00:00:00.000Z'),
+            'user_id': user_id,
+            'shifts': shifts,
+        } for (day, shifts) in sorted(shifts_by_day.items())]
 
     return wrap
 
+def chunk_user_ids(config, user_ids):
+    chunk_size = config.get('user_chunk_size', DEFAULT_USER_CHUNK_SIZE)
+    return [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+
+def iter_date_ranges(start_date, end_date, incr):
+    while start_date < end_date:
+        next_date = min(start_date + incr, end_date)
+        yield start_date, next_date
+        start_date = next_date
+
+
 def sync_user_schedules(config, unit_id, user_ids, first_page):
     logger.info("Fetching user schedules")
     api_instance = PureCloudPlatformApiSdk.WorkforceManagementApi()
@@ -322,49 +532,69 @@ def sync_user_schedules(config, unit_id, user_ids, first_page):
     sync_date = config['start_date']
     lookahead_weeks = config.get('schedule_lookahead_weeks', DEFAULT_SCHEDULE_LOOKAHEAD_WEEKS)
     end_date = datetime.date.today() + datetime.timedelta(weeks=lookahead_weeks)
-    incr = datetime.timedelta(days=1)
-
-    while sync_date < end_date:
-        logger.info("Syncing for {}".format(sync_date))
-        next_date = sync_date + incr
+    incr = datetime.timedelta(days=config.get('schedule_query_days', DEFAULT_SCHEDULE_QUERY_DAYS))
 
-        start_date_s = sync_date.strftime('%Y-%m-%dT00:00:00.000Z')
-        end_date_s = next_date.strftime('%Y-%m-%dT00:00:00.000Z')
+    def fetch_schedules(query):
+        (start_date, end_date), chunk = query
+        logger.info("Syncing for {} to {} ({} users)".format(start_date, end_date, len(chunk)))
 
         body = PureCloudPlatformApiSdk.UserListScheduleRequestBody()
-        body.user_ids = user_ids
-        body.start_date = start_date_s
-        body.end_date = end_date_s
+        body.user_ids = chunk
+        body.start_date = start_date.strftime('%Y-%m-%dT00:00:00.000Z')
+        body.end_date = end_date.strftime('%Y-%m-%dT00:00:00.000Z')
 
         getter = lambda *args, **kwargs: api_instance.post_managementunits_mu_id_schedules_search(unit_id, body=body)
         gen_schedules = fetch_all_analytics_records(getter, body, 'user_schedules', max_pages=1)
+        return [list(page.items()) for page in gen_schedules]
 
-        stream_results(gen_schedules, handle_schedule(start_date_s), 'user_schedule', schemas.user_schedule, ['start_date', 'user_id'], first_page)
+    # large units are queried a chunk of users at a time, so request and
+    # response sizes stay bounded; chunks are written in query order
+    chunks = chunk_user_ids(config, user_ids)
+    queries = ((date_range, chunk) for date_range in iter_date_ranges(sync_date, end_date, incr) for chunk in chunks)
+    max_concurrent_requests = config.get('max_concurrent_requests', DEFAULT_MAX_CONCURRENT_REQUESTS)
 
-        sync_date = next_date
+    for (date_range, chunk), user_schedules in scheduler.ordered_map(fetch_schedules, queries, max_concurrent_requests):
+        stream_results_list(user_schedules, handle_schedule_days(*date_range), 'user_schedule', schemas.user_schedule, ['start_date', 'user_id'], first_page)
         first_page = False
 
 
-def sync_wfm_historical_adherence(config, unit_id, users, body):
-    # The ol' Python pass-by-reference
-    result_reference = {}
-    wfm_notifcation_thread = tap_purecloud.websocket_helper.get_historical_adherence(config, result_reference)
+def get_historical_adherence_url(channel, unit_id, body):
+    api_instance = PureCloudPlatformClientV2.WorkforceManagementApi()
 
-    # give the webhook a chance to get settled
-    logger.info("Waiting for websocket to settle")
-    time.sleep(3)
+    # a query whose notification may have been lost while the channel
+    # reconnected is submitted again
+    for attempt in range(ADHERENCE_QUERY_ATTEMPTS):
+        generation = channel.wait_until_connected()
 
-    logger.info("POSTING adherence request")
-    api_instance = PureCloudPlatformClientV2.WorkforceManagementApi()
-    wfm_response = api_instance.post_workforcemanagement_managementunit_historicaladherencequery(
-            unit_id, body=body)
+        logger.info("POSTING adherence request")
+        wfm_response = api_instance.post_workforcemanagement_managementunit_historicaladherencequery(
+                unit_id, body=body)
 
-    logger.info("Waiting for notification")
-    wfm_notifcation_thread.join()
+        if wfm_response.download_url:
+            return wfm_response.download_url
 
-    url = result_reference['downloadUrl']
-    response = requests.get(url).json()
-    yield response['data']
+        logger.info("Waiting for notification for query {}".format(wfm_response.id))
+        try:
+            notification = channel.wait_for(wfm_response.id, generation)
+            return notification['downloadUrl']
+        except tap_purecloud.websocket_helper.NotificationLost as e:
+            logger.warning("{}, resubmitting the query".format(e))
+
+    raise RuntimeError("Historical adherence query for unit {} failed after {} attempts".format(unit_id, ADHERENCE_QUERY_ATTEMPTS))
+
+
+def iter_historical_adherence_download(url):
+    # stream the result file, handing records on in batches as they are parsed
+    response = connections.pools.session.get(url, stream=True)
+    try:
+        # an error or expired download url comes back as a JSON error body
+        response.raise_for_status()
+        chunks = json_stream.decode_utf8(response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE))
+        records = json_stream.iter_array_items(chunks, 'data')
+        for batch in json_stream.iter_batches(records, DOWNLOAD_BATCH_SIZE):
+            yield batch
+    finally:
+        response.close()
 
 
 def handle_adherence(unit_id):
@@ -373,126 +603,408 @@ def handle_adherence(unit_id):
         return parse_dates(record)
     return handle
 
-def get_user_unit_mapping(users):
-    unit_users = collections.defaultdict(list)
-    for item in users:
-        user_id = item['user_id']
-        management_unit_id = item['management_unit_id']
-        unit_users[management_unit_id].append(user_id)
-    return unit_users
 
+def get_adherence_impact(impact_seconds):
+    if impact_seconds is None:
+        return None
+    elif impact_seconds > 0:
+        return 'Positive'
+    elif impact_seconds < 0:
+        return 'Negative'
+    else:
+        return 'Neutral'
+
+
+def get_percentage(numerator, denominator):
+    if numerator is None or not denominator:
+        return None
+    return 100.0 * numerator / denominator
+
+
+def get_day_adherence(metric):
+    # The record-level impact and percentages of a multi-day query cover
+    # the whole range, so each day's are taken from its day metrics. The
+    # API's day metrics carry their own adherencePercentage and
+    # conformancePercentage, which are used as is. Otherwise they're worked
+    # out the way the API's field definitions describe them: adherence is
+    # the share of adherence-scheduled time not spent in an exception,
+    # conformance is on-queue time worked over on-queue time scheduled, and
+    # impact is the sign of impactSeconds.
+    adherence_secs = metric.get('adherenceScheduleSecs')
+    exception_secs = metric.get('exceptionDurationSecs') or 0
+
+    impact = metric.get('impact', get_adherence_impact(metric.get('impactSeconds')))
+    adherence = metric.get('adherencePercentage')
+    if adherence is None and adherence_secs is not None:
+        adherence = get_percentage(adherence_secs - exception_secs, adherence_secs)
+    conformance = metric.get('conformancePercentage')
+    if conformance is None:
+        conformance = get_percentage(metric.get('conformanceActualSecs'), metric.get('conformanceScheduleSecs'))
+
+    return impact, adherence, conformance
+
+
+def split_adherence_record(record, days):
+    # A multi-day query returns one record per user, with day metrics and
+    # exceptions offset in seconds from the query start. Split it back into
+    # the one-record-per-day shape a single day query returns.
+    if days == 1:
+        return [record]
+
+    range_start = datetime.datetime.strptime(record['startDate'][:10], '%Y-%m-%d')
+    day_metrics = record.get('dayMetrics') or []
+    exceptions = record.get('exceptionInfo') or []
+
+    day_records = []
+    for day in range(days):
+        day_start_secs = day * SECONDS_PER_DAY
+        day_end_secs = day_start_secs + SECONDS_PER_DAY
+
+        day_start = range_start + datetime.timedelta(days=day)
+        day_end = day_start + datetime.timedelta(days=1)
+
+        metrics = []
+        for metric in day_metrics:
+            if day_start_secs <= metric.get('dayStartOffsetSecs', 0) < day_end_secs:
+                metric = dict(metric)
+                metric['dayStartOffsetSecs'] -= day_start_secs
+                metrics.append(metric)
+
+        day_exceptions = []
+        for exception in exceptions:
+            if day_start_secs <= exception.get('startOffsetSeconds', 0) < day_end_secs:
+                exception = dict(exception)
+                exception['startOffsetSeconds'] -= day_start_secs
+                if exception.get('endOffsetSeconds') is not None:
+                    exception['endOffsetSeconds'] -= day_start_secs
+                day_exceptions.append(exception)
+
+        day_record = dict(record)
+        # keep the exact format the API used for the date-time strings
+        day_record['startDate'] = day_start.strftime('%Y-%m-%d') + record['startDate'][10:]
+        day_record['endDate'] = day_end.strftime('%Y-%m-%d') + record['startDate'][10:]
+        day_record['dayMetrics'] = metrics
+        day_record['exceptionInfo'] = day_exceptions
+
+        if len(metrics) > 0:
+            impact, adherence, conformance = get_day_adherence(metrics[0])
+            day_record['impact'] = impact
+            day_record['adherencePercentage'] = adherence
+            day_record['conformancePercentage'] = conformance
+        else:
+            day_record['impact'] = None
+            day_record['adherencePercentage'] = None
+            day_record['conformancePercentage'] = None
+
+        day_records.append(day_record)
+
+    return day_records
+
+
+def handle_adherence_days(unit_id, days):
+    handle = handle_adherence(unit_id)
+
+    def wrap(record):
+        return [handle(day_record) for day_record in split_adherence_record(record, days)]
+    return wrap
 
-def sync_historical_adherence(config, unit_id, users, first_page):
+
+def get_adherence_query_days(config):
+    query_days = config.get('adherence_query_days', DEFAULT_ADHERENCE_QUERY_DAYS)
+    if query_days > MAX_ADHERENCE_QUERY_DAYS:
+        logger.warning("adherence_query_days is limited to {} days".format(MAX_ADHERENCE_QUERY_DAYS))
+        query_days = MAX_ADHERENCE_QUERY_DAYS
+    return query_days
+
+
+def sync_historical_adherence(config, channel, unit_id, users, first_page):
 
     sync_date = config['start_date']
 
     end_date = datetime.date.today()
-    incr = datetime.timedelta(days=1)
-
-    sync_date = sync_date - incr
+    incr = datetime.timedelta(days=get_adherence_query_days(config))
 
-    while sync_date < end_date:
-        logger.info("Syncing historical adherence for {}".format(sync_date))
-        next_date = sync_date + incr
+    sync_date = sync_date - datetime.timedelta(days=1)
 
-        start_date_s = sync_date.strftime('%Y-%m-%dT00:00:00.000Z')
-        end_date_s = next_date.strftime('%Y-%m-%dT00:00:00.000Z')
+    def run_query(query):
+        (start_date, end_date), chunk = query
+        logger.info("Syncing historical adherence for {} to {} ({} users)".format(start_date, end_date, len(chunk)))
 
         body = PureCloudPlatformClientV2.WfmHistoricalAdherenceQuery()
-        body.start_date = start_date_s
-        body.end_date = end_date_s
-        body.user_ids = users
+        body.start_date = start_date.strftime('%Y-%m-%dT00:00:00.000Z')
+        body.end_date = end_date.strftime('%Y-%m-%dT00:00:00.000Z')
+        body.user_ids = chunk
         body.include_exceptions = True
         body.time_zone = "UTC"
 
-        gen_adherence = sync_wfm_historical_adherence(config, unit_id, users, body)
-        stream_results(gen_adherence, handle_adherence(unit_id), 'historical_adherence', schemas.historical_adherence, ['userId', 'management_unit_id', 'startDate'], first_page)
+        return get_historical_adherence_url(channel, unit_id, body)
 
-        sync_date = next_date
+    # queries for the next chunks are submitted and waited on while the
+    # current result file is downloaded and written
+    chunks = chunk_user_ids(config, users)
+    queries = ((date_range, chunk) for date_range in iter_date_ranges(sync_date, end_date, incr) for chunk in chunks)
+    max_concurrent_requests = config.get('max_concurrent_requests', DEFAULT_MAX_CONCURRENT_REQUESTS)
+
+    for ((start_date, end_date), chunk), url in scheduler.ordered_map(run_query, queries, max_concurrent_requests):
+        days = (end_date - start_date).days
+        gen_adherence = iter_historical_adherence_download(url)
+        stream_results_list(gen_adherence, handle_adherence_days(unit_id, days), 'historical_adherence', schemas.historical_adherence, ['userId', 'management_unit_id', 'startDate'], first_page)
         first_page = False
 
-def sync_management_units(config):
+def sync_management_units(config, state):
     logger.info("Fetching management units")
     api_instance = PureCloudPlatformApiSdk.WorkforceManagementApi()
     body = FakeBody()
-    getter = get_wfm_units_for_broken_sdk(api_instance)
+
+    # last_response lives on the api client, so give this call its own
+    # client in case other streams are using the shared one concurrently
+    units_api_instance = PureCloudPlatformApiSdk.WorkforceManagementApi(new_api_client(PureCloudPlatformApiSdk))
+    getter = get_wfm_units_for_broken_sdk(units_api_instance)
     gen_units = fetch_all_records(getter, 'entities', body)
 
     # first, write out the units
-    mgmt_units = stream_results(gen_units, lambda x: x, 'management_unit', schemas.management_unit, ['id'], True)
-
-    for i, unit in enumerate(mgmt_units):
-        logger.info("Syncing mgmt unit {} of {}".format(i + 1, len(mgmt_units)))
-        first_page = (i == 0)
-        unit_id = unit['id']
+    unit_ids = stream_results(gen_units, lambda x: x, 'management_unit', schemas.management_unit, ['id'], True, key='id')
+
+    if len(unit_ids) > 0:
+        output.write_schema('activity_code', schemas.activity_code, ['id', 'management_unit_id'])
+        output.write_schema('management_unit_users', schemas.management_unit_users, ['user_id', 'management_unit_id'])
+        output.write_schema('user_schedule', schemas.user_schedule, ['start_date', 'user_id'])
+        output.write_schema('historical_adherence', schemas.historical_adherence, ['userId', 'management_unit_id', 'startDate'])
+
+    def sync_management_unit(indexed_unit_id):
+        i, unit_id = indexed_unit_id
+
+        if synced_through.get(unit_id) == today:
+            logger.info("Skipping mgmt unit {} of {}, already synced".format(i + 1, len(unit_ids)))
+            return
+
+        # a unit synced by an earlier, failed run only needs the days since
+        unit_config = config
+        if unit_id in synced_through:
+            logger.info("Resuming mgmt unit {} of {} from {}".format(i + 1, len(unit_ids), synced_through[unit_id]))
+            unit_config = dict(config, start_date=parse_input_date(synced_through[unit_id]))
+        else:
+            logger.info("Syncing mgmt unit {} of {}".format(i + 1, len(unit_ids)))
 
         # don't allow args here
         getter = lambda *args, **kwargs: api_instance.get_managementunits_mu_id_activitycodes(unit_id)
         gen_activitycodes = fetch_all_records(getter, 'activity_codes', FakeBody(), max_pages=1)
-        stream_results(gen_activitycodes, handle_activity_codes(unit_id), 'activity_code', schemas.activity_code, ['id', 'management_unit_id'], first_page)
+        stream_results(gen_activitycodes, handle_activity_codes(unit_id), 'activity_code', schemas.activity_code, ['id', 'management_unit_id'], False)
 
         # don't allow args here
         getter = lambda *args, **kwargs: api_instance.get_managementunits_mu_id_users(unit_id)
         gen_users = fetch_all_records(getter, 'entities', FakeBody(), max_pages=1)
-        users = stream_results(gen_users, handle_mgmt_users(unit_id), 'management_unit_users', schemas.management_unit_users, ['user_id', 'management_unit_id'], first_page)
+        user_ids = stream_results(gen_users, handle_mgmt_users(unit_id), 'management_unit_users', schemas.management_unit_users, ['user_id', 'management_unit_id'], False, key='user_id')
+
+        sync_user_schedules(unit_config, unit_id, user_ids, False)
+        sync_historical_adherence(unit_config, channel, unit_id, user_ids, False)
+
+        with STATE_LOCK:
+            synced_through[unit_id] = today
+            write_bookmark(state, 'management_unit', 'synced_through', dict(synced_through))
 
-        user_ids = [user['user_id'] for user in users]
-        sync_user_schedules(config, unit_id, user_ids, first_page)
+    # the day each unit was last synced through, so a run resumed on a
+    # later day still picks up the days in between
+    today = datetime.date.today().strftime('%Y-%m-%d')
+    synced_through = dict(get_bookmark(state, 'management_unit', 'synced_through', {}))
+    if all(synced_through.get(unit_id) == today for unit_id in unit_ids):
+        return
 
-        unit_users = get_user_unit_mapping(users)
-        sync_historical_adherence(config, unit_id, unit_users[unit_id], first_page)
+    # every unit's adherence queries share one notification channel
+    channel = tap_purecloud.websocket_helper.NotificationChannel(config, tap_purecloud.websocket_helper.ADHERENCE_CHANNEL)
+
+    # units are independent, and their records are written straight from
+    # the worker that syncs them
+    max_concurrent_units = config.get('max_concurrent_units', DEFAULT_MAX_CONCURRENT_UNITS)
+    try:
+        for _ in scheduler.ordered_map(sync_management_unit, enumerate(unit_ids), max_concurrent_units):
+            pass
+    finally:
+        channel.close()
 
 
 def handle_conversation(conversation_record):
-    conversation = handle_object(conversation_record)
+    # converts the conversation and its participants, sessions and segments
+    # in a single pass (see converters.compile_converter)
+    return converters.convert(conversation_record)
+
+
+def format_interval(start_date, end_date):
+    return '{}/{}'.format(
+        start_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        end_date.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+    )
+
+
+def get_window_planner(config):
+    if not config.get('adaptive_windows', False):
+        return None
 
-    participants = []
-    for participant_record in conversation_record.participants:
-        participants.append(handle_object(participant_record))
+    target_pages = config.get('window_target_pages', DEFAULT_WINDOW_TARGET_PAGES)
+    max_window_days = config.get('max_window_days', DEFAULT_MAX_WINDOW_DAYS)
+    return scheduler.WindowPlanner(target_pages, max_window=datetime.timedelta(days=max_window_days))
 
-        sessions = []
-        for session_record in participant_record.sessions:
-            sessions.append(handle_object(session_record))
 
-            segments = []
-            for segment_record in session_record.segments:
-                segments.append(handle_object(segment_record))
+def as_datetime(date):
+    if not isinstance(date, datetime.datetime):
+        date = datetime.datetime.combine(date, datetime.time())
+    return date
 
-            sessions[-1]['segments'] = segments
-        participants[-1]['sessions'] = sessions
-    conversation['participants'] = participants
 
-    return conversation
+def plan_windows(planner, start_date, end_date):
+    start_date = as_datetime(start_date)
+    end_date = as_datetime(end_date)
 
+    if planner is None:
+        return scheduler.date_windows(start_date, end_date)
+    return planner.windows(start_date, end_date)
 
-def sync_conversations(config):
+
+def get_window_start(config, state, stream):
+    window_end = get_bookmark(state, stream, 'window_end')
+    if window_end is None:
+        return config['start_date']
+
+    logger.info("Resuming {} from {}".format(stream, window_end))
+    return datetime.datetime.strptime(window_end, BOOKMARK_DATETIME_FORMAT)
+
+
+def observe_window(planner, window, pages):
+    if planner is None:
+        return pages
+    return planner.observed(window, pages)
+
+
+def sync_conversations(config, state):
     logger.info("Fetching conversations")
     api_instance = PureCloudPlatformApiSdk.ConversationsApi()
+    prefetch = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
 
-    sync_date = config['start_date']
+    sync_date = get_window_start(config, state, 'conversation')
     end_date = datetime.date.today() + datetime.timedelta(days=1)
-    incr = datetime.timedelta(days=1)
+    max_concurrent_windows = config.get('max_concurrent_windows', DEFAULT_MAX_CONCURRENT_WINDOWS)
+
+    # in raw mode, responses are mapped straight from JSON to records
+    if config.get('raw_analytics', False):
+        get_conversations = get_raw_analytics_records(CONVERSATION_DETAILS_PATH)
+        transform_conversation = handle_raw_conversation
+    else:
+        get_conversations = api_instance.post_conversations_details_query
+        transform_conversation = handle_conversation
 
     first_page = True
-    while sync_date < end_date:
-        logger.info("Syncing for {}".format(sync_date))
-        next_date = sync_date + incr
-        interval = '{}/{}'.format(
-            sync_date.strftime('%Y-%m-%dT00:00:00.000Z'),
-            next_date.strftime('%Y-%m-%dT00:00:00.000Z')
-        )
+
+    jobs_end = get_conversation_jobs_end(config)
+    if jobs_end is not None and as_datetime(sync_date) < jobs_end:
+        first_page = sync_conversation_jobs(config, state, sync_date, jobs_end, first_page)
+        sync_date = jobs_end
+
+    def fetch_window(window):
+        logger.info("Syncing for {}".format(format_interval(*window)))
 
         body = PureCloudPlatformApiSdk.ConversationQuery()
-        body.interval = interval
+        body.interval = format_interval(*window)
         body.order = "asc"
         body.orderBy = "conversationStart"
 
-        gen_conversations = fetch_all_analytics_records(api_instance.post_conversations_details_query, body, 'conversations')
-        stream_results(gen_conversations, handle_conversation, 'conversation', schemas.conversation, ['conversation_id'], first_page)
+        pages = fetch_all_analytics_records(get_conversations, body, 'conversations', prefetch=prefetch, tuner=page_sizes.get_tuner(config, 'conversation'))
+        return observe_window(planner, window, pages)
 
-        sync_date = next_date
+    planner = get_window_planner(config)
+    windows = plan_windows(planner, sync_date, end_date)
+
+    for window, gen_conversations in scheduler.map_windows(fetch_window, windows, max_concurrent_windows):
+        stream_results(gen_conversations, transform_conversation, 'conversation', schemas.conversation, ['conversation_id'], first_page)
         first_page = False
 
+        write_bookmark(state, 'conversation', 'window_end', window[1].strftime(BOOKMARK_DATETIME_FORMAT))
+
+
+def get_conversation_jobs_end(config):
+    # Conversations older than conversation_jobs_older_than_days days are
+    # backfilled with analytics jobs, up to the point the jobs API has data for
+    older_than_days = config.get('conversation_jobs_older_than_days')
+    if older_than_days is None:
+        return None
+
+    cutoff = datetime.date.today() - datetime.timedelta(days=older_than_days)
+
+    response = request_raw_api('GET', CONVERSATION_JOBS_AVAILABILITY_PATH)
+    available = dateutil.parser.parse(response['dataAvailabilityDate'])
+    available = available.astimezone(datetime.timezone.utc).date()
+
+    return datetime.datetime.combine(min(cutoff, available), datetime.time())
+
+
+def submit_conversation_details_job(window):
+    body = {
+        'interval': format_interval(*window),
+        'order': 'asc',
+        'orderBy': 'conversationStart',
+    }
+    response = request_raw_api('POST', CONVERSATION_JOBS_PATH, body=body)
+    logger.info("Submitted conversation details job {} for {}".format(response['jobId'], body['interval']))
+    return response['jobId']
+
+
+def wait_for_conversation_details_job(job_id, poll_seconds, timeout=CONVERSATION_JOB_TIMEOUT_SECONDS):
+    deadline = time.time() + timeout
+    while True:
+        job = request_raw_api('GET', CONVERSATION_JOB_PATH, {'jobId': job_id})
+        if job['state'] == 'FULFILLED':
+            return
+        elif job['state'] in CONVERSATION_JOB_FAILED_STATES:
+            raise RuntimeError("Conversation details job {} {}: {}".format(job_id, job['state'].lower(), job.get('errorMessage')))
+        elif time.time() > deadline:
+            raise RuntimeError("Conversation details job {} did not finish within {}s".format(job_id, timeout))
+
+        time.sleep(poll_seconds)
+
+
+def iter_conversation_details_job_results(job_id, page_size):
+    query_params = {'pageSize': page_size}
+    while True:
+        logger.info("Fetching {} records from conversation details job {}".format(page_size, job_id))
+        response = request_raw_api('GET', CONVERSATION_JOB_RESULTS_PATH, {'jobId': job_id}, query_params)
+        yield response.get('conversations', [])
+
+        if not response.get('cursor'):
+            break
+        query_params['cursor'] = response['cursor']
+
+
+def sync_conversation_jobs(config, state, start_date, end_date, first_page):
+    # Backfills conversations with the asynchronous analytics jobs API: a
+    # job covers a whole week and its results are paged through with a
+    # cursor, so old ranges take far fewer requests than day by day queries.
+    # Jobs for the next windows run while the current one is written out.
+    logger.info("Backfilling conversations up to {} with analytics jobs".format(end_date))
+    prefetch = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
+    poll_seconds = config.get('conversation_job_poll_seconds', CONVERSATION_JOB_POLL_SECONDS)
+    max_concurrent_windows = config.get('max_concurrent_windows', DEFAULT_MAX_CONCURRENT_WINDOWS)
+
+    incr = datetime.timedelta(days=CONVERSATION_JOB_WINDOW_DAYS)
+    windows = ((start, min(end, end_date)) for (start, end) in scheduler.date_windows(as_datetime(start_date), end_date, incr))
+
+    def run_job(window):
+        with singer.metrics.job_timer('conversation_details'):
+            job_id = submit_conversation_details_job(window)
+            wait_for_conversation_details_job(job_id, poll_seconds)
+        return job_id
+
+    for window, job_id in scheduler.ordered_map(run_job, windows, max_concurrent_windows):
+        pages = iter_conversation_details_job_results(job_id, CONVERSATION_JOB_PAGE_SIZE)
+        if prefetch > 0:
+            pages = scheduler.prefetch(pages, prefetch)
+
+        # job results have the same shape as the query's conversations
+        stream_results(pages, handle_raw_conversation, 'conversation', schemas.conversation, ['conversation_id'], first_page)
+        first_page = False
+
+        write_bookmark(state, 'conversation', 'window_end', window[1].strftime(BOOKMARK_DATETIME_FORMAT))
+
+    return first_page
+
 
 def md5(s):
     hasher = hashlib.md5()
@@ -500,15 +1012,14 @@ def md5(s):
     return hasher.hexdigest()
 
 
-def handle_user_presences(user_details_record):
+def handle_user_presences(user_details):
     presences = []
 
-    if not user_details_record.primary_presence:
+    if not user_details['primary_presence']:
         return presences
 
-    for presence in user_details_record.primary_presence:
-        pres_dict = parse_dates(presence.to_dict())
-        pres_dict['user_id'] = user_details_record.user_id
+    for pres_dict in user_details['primary_presence']:
+        pres_dict['user_id'] = user_details['user_id']
         pres_dict['id'] = md5("{}-{}".format(pres_dict['start_time'], pres_dict['user_id']))
         presences.append({
             'id': pres_dict['id'],
@@ -523,15 +1034,14 @@ def handle_user_presences(user_details_record):
     return presences
 
 
-def handle_user_routing_statuses(user_details_record):
+def handle_user_routing_statuses(user_details):
     statuses = []
 
-    if not user_details_record.routing_status:
+    if not user_details['routing_status']:
         return statuses
 
-    for status in user_details_record.routing_status:
-        status_dict = parse_dates(status.to_dict())
-        status_dict['user_id'] = user_details_record.user_id
+    for status_dict in user_details['routing_status']:
+        status_dict['user_id'] = user_details['user_id']
         status_dict['id'] = md5("{}-{}".format(status_dict['start_time'], status_dict['user_id']))
         statuses.append({
             'id': status_dict['id'],
@@ -545,43 +1055,96 @@ def handle_user_routing_statuses(user_details_record):
     return statuses
 
 
+def handle_user_details_dict(user_details):
+    presences = handle_user_presences(user_details)
+    statuses = handle_user_routing_statuses(user_details)
+
+    return presences + statuses
+
+
 def handle_user_details(user_details_record):
-    user_details = user_details_record.to_dict()
+    return handle_user_details_dict(converters.convert(user_details_record))
 
-    presences = handle_user_presences(user_details_record)
-    statuses = handle_user_routing_statuses(user_details_record)
 
-    return presences + statuses
+def handle_raw_user_details(raw_user_details):
+    convert = converters.get_raw_converter(PureCloudPlatformApiSdk.AnalyticsUserDetail)
+    return handle_user_details_dict(convert(raw_user_details))
+
+
+def handle_raw_conversation(raw_conversation):
+    convert = converters.get_raw_converter(PureCloudPlatformApiSdk.AnalyticsConversation)
+    return convert(raw_conversation)
+
+
+def call_raw_api(method, resource_path, path_params=None, query_params=None, body=None):
+    # Calls the API and returns the parsed JSON body, skipping the SDK's
+    # deserialization into model objects. The body is read from
+    # last_response, so each thread uses its own api client.
+    api_client = get_thread_api_client(PureCloudPlatformApiSdk)
+    header_params = {
+        'Accept': 'application/json',
+        'Content-Type': 'application/json',
+    }
+    api_client.call_api(resource_path, method, path_params or {}, query_params or {}, header_params,
+                        body=body,
+                        post_params=[],
+                        files={},
+                        response_type=None,
+                        auth_settings=['PureCloud Auth'])
+    return json.loads(api_client.last_response.data)
 
 
-def sync_user_details(config):
+@retry_api_call
+def request_raw_api(method, resource_path, path_params=None, query_params=None, body=None):
+    return call_raw_api(method, resource_path, path_params, query_params, body)
+
+
+def get_raw_analytics_records(resource_path):
+    def wrap(body, **kwargs):
+        return call_raw_api('POST', resource_path, body=body)
+    return wrap
+
+
+def sync_user_details(config, state):
     logger.info("Fetching user details")
     api_instance = PureCloudPlatformApiSdk.UsersApi()
+    prefetch = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
 
-    sync_date = config['start_date']
+    sync_date = get_window_start(config, state, 'user_state')
     end_date = datetime.date.today() + datetime.timedelta(days=1)
-    incr = datetime.timedelta(days=1)
+    max_concurrent_windows = config.get('max_concurrent_windows', DEFAULT_MAX_CONCURRENT_WINDOWS)
+
+    # in raw mode, responses are mapped straight from JSON to records, and
+    # the records are under the JSON key rather than the SDK attribute
+    if config.get('raw_analytics', False):
+        get_user_details = get_raw_analytics_records(USER_DETAILS_PATH)
+        transform_user_details = handle_raw_user_details
+        entity_name = 'userDetails'
+    else:
+        get_user_details = api_instance.post_users_details_query
+        transform_user_details = handle_user_details
+        entity_name = 'user_details'
 
-    first_page = True
-    while sync_date < end_date:
-        logger.info("Syncing for {}".format(sync_date))
-        next_date = sync_date + incr
-        interval = '{}/{}'.format(
-            sync_date.strftime('%Y-%m-%dT00:00:00.000Z'),
-            next_date.strftime('%Y-%m-%dT00:00:00.000Z')
-        )
+    def fetch_window(window):
+        logger.info("Syncing for {}".format(format_interval(*window)))
 
         body = PureCloudPlatformApiSdk.UserDetailsQuery()
-        body.interval = interval
+        body.interval = format_interval(*window)
         body.order = "asc"
 
+        pages = fetch_all_analytics_records(get_user_details, body, entity_name, prefetch=prefetch, tuner=page_sizes.get_tuner(config, 'user_state'))
+        return observe_window(planner, window, pages)
 
-        gen_user_details = fetch_all_analytics_records(api_instance.post_users_details_query, body, 'user_details')
-        stream_results_list(gen_user_details, handle_user_details, 'user_state', schemas.user_state, ['id'], first_page)
-        sync_date = next_date
+    planner = get_window_planner(config)
+    windows = plan_windows(planner, sync_date, end_date)
 
+    first_page = True
+    for window, gen_user_details in scheduler.map_windows(fetch_window, windows, max_concurrent_windows):
+        stream_results_list(gen_user_details, transform_user_details, 'user_state', schemas.user_state, ['id'], first_page)
         first_page = False
 
+        write_bookmark(state, 'user_state', 'window_end', window[1].strftime(BOOKMARK_DATETIME_FORMAT))
+
 
 def validate_config(config):
     required_keys = ['domain', 'client_id', 'client_secret', 'start_date']
@@ -638,16 +1201,58 @@ def load_state(filename):
         raise RuntimeError
 
 
+def get_bookmark(state, stream, key, default=None):
+    with STATE_LOCK:
+        return singer.get_bookmark(state, stream, key, default)
+
+
+def write_bookmark(state, stream, key, value):
+    # streams checkpoint from several threads, so the state is updated and
+    # written out under one lock
+    with STATE_LOCK:
+        singer.write_bookmark(state, stream, key, value)
+        output.write_state(copy.deepcopy(state))
+
+
 def parse_input_date(date_string):
     return datetime.datetime.strptime(date_string, '%Y-%m-%d').date()
 
 
+def get_http_pool_size(config):
+    if 'http_pool_size' in config:
+        return config['http_pool_size']
+
+    # enough connections for every worker that may be making a request.
+    # The worker pools nest, so a stream's share is the product of its
+    # settings, not the largest of them.
+    max_concurrent_streams = config.get('max_concurrent_streams', DEFAULT_MAX_CONCURRENT_STREAMS)
+    max_concurrent_windows = config.get('max_concurrent_windows', DEFAULT_MAX_CONCURRENT_WINDOWS)
+    max_concurrent_requests = config.get('max_concurrent_requests', DEFAULT_MAX_CONCURRENT_REQUESTS)
+    max_concurrent_units = config.get('max_concurrent_units', DEFAULT_MAX_CONCURRENT_UNITS)
+    max_concurrent_pages = config.get('max_concurrent_pages', DEFAULT_MAX_CONCURRENT_PAGES)
+    prefetch_pages = config.get('prefetch_pages', DEFAULT_PREFETCH_PAGES)
+
+    workers_per_stream = max(
+        # conversation and user details windows, each prefetching pages
+        max_concurrent_windows * (1 + prefetch_pages),
+        # management units, each querying chunks of users
+        max_concurrent_units * max_concurrent_requests,
+        # pages of queues, while their children are fetched
+        max_concurrent_pages + prefetch_pages + max_concurrent_requests,
+    )
+
+    return max(connections.DEFAULT_POOL_SIZE, max_concurrent_streams * workers_per_stream)
+
+
 def do_sync(args):
     logger.info("Starting sync.")
 
     config = load_config(args.config)
     state = load_state(args.state)
 
+    output.configure(config)
+    page_sizes.load_sizes(state)
+
     # grab start date from state file. If not found
     # default to value in config file
 
@@ -660,31 +1265,66 @@ def do_sync(args):
 
     config['start_date'] = start_date
 
-    logger.info("Getting access token")
-    access_token = get_access_token(config)
+    # bookmarks written mid-run are only valid for this start date
+    state['start_date'] = start_date.strftime('%Y-%m-%d')
+
+    pool_size = get_http_pool_size(config)
+    connections.pools.configure(pool_size, config.get('http_keep_alive', True))
 
     api_host = 'https://api.{domain}'.format(domain=config['domain'])
     PureCloudPlatformApiSdk.configuration.host = api_host
-    PureCloudPlatformApiSdk.configuration.access_token = access_token
-
     PureCloudPlatformClientV2.configuration.host = api_host
-    PureCloudPlatformClientV2.configuration.access_token = access_token
 
-    sync_users(config)
-    sync_groups(config)
-    sync_locations(config)
-    sync_presence_definitions(config)
-    sync_queues(config)
+    # keeps both SDK configurations supplied with a fresh access token
+    tokens = token_manager.TokenManager(
+        config,
+        request_access_token,
+        [PureCloudPlatformApiSdk.configuration, PureCloudPlatformClientV2.configuration],
+        config.get('token_cache_path'))
+    tokens.start()
+
+    max_requests_per_second = config.get('max_requests_per_second', rate_limiter.DEFAULT_REQUESTS_PER_SECOND)
+    rate_limiter.limiter.configure(max_requests_per_second)
+
+    for sdk in [PureCloudPlatformApiSdk, PureCloudPlatformClientV2]:
+        sdk.configuration.api_client = sdk.ApiClient()
+        connections.pools.install(sdk.configuration.api_client.rest_client)
+        metrics.run_metrics.install(sdk.configuration.api_client.rest_client)
+        rate_limiter.limiter.install(sdk.configuration.api_client.rest_client)
+
+    # optionally skip reference records that haven't changed since the last run
+    fingerprint_store = fingerprints.load_fingerprint_store(config)
+
+    syncs = [
+        functools.partial(sync_users, config, fingerprint_store),
+        functools.partial(sync_groups, config, fingerprint_store),
+        functools.partial(sync_locations, config, fingerprint_store),
+        functools.partial(sync_presence_definitions, config, fingerprint_store),
+        functools.partial(sync_queues, config, fingerprint_store),
+        functools.partial(sync_management_units, config, state),
+        functools.partial(sync_conversations, config, state),
+        functools.partial(sync_user_details, config, state),
+    ]
+
+    max_concurrent_streams = config.get('max_concurrent_streams', DEFAULT_MAX_CONCURRENT_STREAMS)
+    try:
+        scheduler.run_streams(syncs, max_concurrent_streams)
+    finally:
+        tokens.stop()
+        output.flush()
+        metrics.run_metrics.log_summary()
+
+    if fingerprint_store is not None:
+        fingerprint_store.save()
 
-    sync_management_units(config)
-    sync_conversations(config)
-    sync_user_details(config)
+    connections.pools.log_stats()
 
     new_state = {
-        'start_date': datetime.date.today().strftime('%Y-%m-%d')
+        'start_date': datetime.date.today().strftime('%Y-%m-%d'),
+        'page_sizes': page_sizes.get_sizes(),
     }
 
-    singer.write_state(new_state)
+    output.write_state(new_state)
 
 
 def main():
@@ -0,0 +1,100 @@
+import socket
+import threading
+
+import requests
+import requests.adapters
+import urllib3
+from urllib3.connection import HTTPConnection
+
+import singer
+logger = singer.get_logger()
+
+DEFAULT_POOL_SIZE = 4
+NUM_POOLS = 4
+TLS_KEYS = ('cert_reqs', 'ca_certs', 'cert_file', 'key_file')
+
+
+def get_socket_options(keep_alive):
+    socket_options = list(HTTPConnection.default_socket_options)
+    if keep_alive:
+        socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+    return socket_options
+
+
+class PooledAdapter(requests.adapters.HTTPAdapter):
+    # sends the session's requests through the shared pool manager
+    def __init__(self, pool_manager, **kwargs):
+        self.shared_pool_manager = pool_manager
+        super(PooledAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self.poolmanager = self.shared_pool_manager
+
+
+class ConnectionPools(object):
+    # One keep-alive pool manager for everything the tap sends: auth and
+    # download requests go through the requests session, and the two SDKs'
+    # rest clients are switched over to the same manager, so both SDKs
+    # reuse one set of connections to the API host.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.configure(DEFAULT_POOL_SIZE, True)
+
+    def configure(self, pool_size, keep_alive):
+        self.pool_size = pool_size
+        pool_manager = urllib3.PoolManager(num_pools=NUM_POOLS, maxsize=pool_size,
+                                           socket_options=get_socket_options(keep_alive))
+
+        session = requests.Session()
+        adapter = PooledAdapter(pool_manager)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        with self.lock:
+            self.session = session
+            self.pool_manager = pool_manager
+            self.tls_kw = None
+
+    def install(self, rest_client):
+        # keep the SDK's TLS settings; both SDKs build them from the same
+        # configuration, so their connections can be shared
+        tls_kw = {key: rest_client.pool_manager.connection_pool_kw.get(key) for key in TLS_KEYS}
+
+        with self.lock:
+            if self.tls_kw is None:
+                self.tls_kw = tls_kw
+                self.pool_manager.connection_pool_kw.update(tls_kw)
+            elif tls_kw != self.tls_kw:
+                logger.warning("SDK clients have different TLS settings, so they can't share connections")
+                rest_client.pool_manager = urllib3.PoolManager(
+                    num_pools=NUM_POOLS, maxsize=self.pool_size,
+                    socket_options=self.pool_manager.connection_pool_kw['socket_options'], **tls_kw)
+                return
+
+            rest_client.pool_manager = self.pool_manager
+
+    def stats(self):
+        connections = 0
+        requests_made = 0
+
+        with self.lock:
+            pool_manager = self.pool_manager
+
+        for key in pool_manager.pools.keys():
+            pool = pool_manager.pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+                requests_made += pool.num_requests
+
+        return {
+            'connections': connections,
+            'requests': requests_made,
+            'reused': max(0, requests_made - connections),
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info("Made {requests} requests over {connections} connections ({reused} reused)".format(**stats))
+
+
+pools = ConnectionPools()
@@ -0,0 +1,185 @@
+import ast
+import datetime
+import importlib
+import inspect
+import re
+import threading
+
+import dateutil.parser
+
+# Declared swagger types whose values can be copied across untouched
+PRIMITIVE_TYPES = {'str', 'int', 'float', 'bool', 'long', 'date'}
+
+LIST_TYPE = re.compile(r'^list\[(.*)\]$')
+DICT_TYPE = re.compile(r'^dict\(([^,]*), (.*)\)$')
+ALLOWED_VALUES = re.compile(r'allowed_values = (\[.*\])')
+OUTDATED_ENUM_VALUE = 'outdated_sdk_version'
+UTC_DATETIME = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d{1,6}))?Z$')
+
+_converters = {}
+_raw_converters = {}
+_raw_converters_lock = threading.RLock()
+
+
+def convert_value(value):
+    if value is None:
+        return None
+    elif isinstance(value, datetime.datetime):
+        return value.isoformat()
+    elif isinstance(value, list):
+        return [convert_value(item) for item in value]
+    elif isinstance(value, dict):
+        return {k: convert_value(v) for (k, v) in value.items()}
+    elif hasattr(value, 'swagger_types'):
+        return get_converter(value)(value)
+    else:
+        return value
+
+
+def convert_datetime(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return convert_value(value)
+
+
+def compile_converter(model):
+    # Builds a function that turns an instance of model's class into the
+    # same dict as parse_dates(model.to_dict()), in a single pass. Nested
+    # models are converted by their own compiled converters, and date-times
+    # are formatted wherever they appear.
+    fields = []
+    for attr, swagger_type in model.swagger_types.items():
+        if swagger_type in PRIMITIVE_TYPES:
+            convert = None
+        elif swagger_type == 'datetime':
+            convert = convert_datetime
+        else:
+            convert = convert_value
+        fields.append((attr, '_' + attr, convert))
+
+    fields = tuple(fields)
+
+    def convert_model(obj):
+        values = obj.__dict__
+        result = {}
+        for attr, private_attr, convert in fields:
+            value = values[private_attr]
+            if convert is None or value is None:
+                result[attr] = value
+            else:
+                result[attr] = convert(value)
+        return result
+
+    return convert_model
+
+
+def get_converter(obj):
+    model_class = type(obj)
+    converter = _converters.get(model_class)
+    if converter is None:
+        converter = compile_converter(obj)
+        _converters[model_class] = converter
+    return converter
+
+
+def convert(obj):
+    return get_converter(obj)(obj)
+
+
+def normalize_datetime(value):
+    # Formats an API date-time string exactly as the SDK's parsed datetime
+    # would be by isoformat(), without building the datetime for the usual
+    # UTC case
+    match = UTC_DATETIME.match(value)
+    if match is None:
+        return dateutil.parser.parse(value).isoformat()
+
+    seconds, fraction = match.groups()
+    if fraction is None or int(fraction) == 0:
+        return seconds + '+00:00'
+    return '{}.{}+00:00'.format(seconds, fraction.ljust(6, '0'))
+
+
+def compile_raw_type(swagger_type, sdk):
+    if swagger_type in PRIMITIVE_TYPES or swagger_type == 'object':
+        return None
+    elif swagger_type == 'datetime':
+        return normalize_datetime
+
+    list_match = LIST_TYPE.match(swagger_type)
+    if list_match is not None:
+        convert_item = compile_raw_type(list_match.group(1), sdk)
+        if convert_item is None:
+            return None
+        return lambda values: [None if v is None else convert_item(v) for v in values]
+
+    dict_match = DICT_TYPE.match(swagger_type)
+    if dict_match is not None:
+        convert_item = compile_raw_type(dict_match.group(2), sdk)
+        if convert_item is None:
+            return None
+        return lambda values: {k: None if v is None else convert_item(v) for (k, v) in values.items()}
+
+    return get_raw_converter(getattr(sdk, swagger_type))
+
+
+def get_allowed_values(model_class, attr):
+    # Enum setters only keep known values, lower-cased. The allowed values
+    # only appear in the setter's source, so read them from there.
+    setter = getattr(model_class, attr).fset
+    match = ALLOWED_VALUES.search(inspect.getsource(setter))
+    if match is None:
+        return None
+    return {value.lower() for value in ast.literal_eval(match.group(1))}
+
+
+def compile_raw_enum(allowed_values):
+    def convert_enum(value):
+        value = value.lower()
+        if value in allowed_values:
+            return value
+        return OUTDATED_ENUM_VALUE
+    return convert_enum
+
+
+def compile_raw_converter(model_class):
+    # Builds a function that maps a model's JSON (camelCase keys, date-time
+    # strings) straight to the dict convert() would produce for the
+    # deserialized model, without constructing any SDK objects
+    sdk = importlib.import_module(model_class.__module__.split('.')[0])
+    model = model_class()
+
+    fields = []
+    convert_model = lambda raw: convert_fields(raw, fields)
+
+    # register before compiling fields so recursive models resolve
+    _raw_converters[model_class] = convert_model
+
+    for attr, swagger_type in model.swagger_types.items():
+        allowed_values = get_allowed_values(model_class, attr)
+        if allowed_values is not None:
+            convert = compile_raw_enum(allowed_values)
+        else:
+            convert = compile_raw_type(swagger_type, sdk)
+        fields.append((attr, model.attribute_map[attr], convert))
+
+    return convert_model
+
+
+def convert_fields(raw, fields):
+    result = {}
+    for attr, json_key, convert in fields:
+        value = raw.get(json_key)
+        if convert is None or value is None:
+            result[attr] = value
+        else:
+            result[attr] = convert(value)
+    return result
+
+
+def get_raw_converter(model_class):
+    with _raw_converters_lock:
+        converter = _raw_converters.get(model_class)
+        if converter is None:
+            converter = compile_raw_converter(model_class)
+        return converter
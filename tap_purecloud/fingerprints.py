@@ -0,0 +1,83 @@
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import singer
+logger = singer.get_logger()
+
+
+def fingerprint(record):
+    serialized = json.dumps(record, sort_keys=True, default=str)
+    return hashlib.md5(serialized.encode('utf-8')).hexdigest()
+
+
+def record_key(record, primary_key):
+    return json.dumps([record.get(key) for key in primary_key], default=str)
+
+
+class FingerprintStore(object):
+    # Remembers a content hash for every record emitted by the reference
+    # streams, so records that haven't changed since the last successful
+    # run can be skipped. Hashes seen this run only replace the stored ones
+    # when save() is called at the end of a successful run.
+    def __init__(self, path):
+        self.path = path
+        self.previous = self.load(path)
+        self.current = collections.defaultdict(dict)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load(path):
+        if not os.path.exists(path):
+            return {}
+
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except ValueError:
+            logger.warning("Could not decode fingerprint store {}, emitting all records".format(path))
+            return {}
+
+    def filter_changed(self, stream_name, primary_key, records):
+        changed = []
+
+        with self.lock:
+            previous = self.previous.get(stream_name, {})
+            current = self.current[stream_name]
+
+            for record in records:
+                key = record_key(record, primary_key)
+                digest = fingerprint(record)
+                current[key] = digest
+
+                if previous.get(key) != digest:
+                    changed.append(record)
+
+        return changed
+
+    def save(self):
+        with self.lock:
+            fingerprints = dict(self.previous)
+            fingerprints.update(self.current)
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.fingerprints-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(fingerprints, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        logger.info("Saved fingerprints for {} streams to {}".format(len(self.current), self.path))
+
+
+def load_fingerprint_store(config):
+    path = config.get('fingerprint_path')
+    if path is None:
+        return None
+    return FingerprintStore(path)
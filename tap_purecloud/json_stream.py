@@ -0,0 +1,122 @@
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+NUMBER_START = '-0123456789'
+NUMBER_CHARS = '0123456789+-.eE'
+
+decoder = json.JSONDecoder()
+
+
+class JsonReader(object):
+    # Reads JSON values one at a time from an iterator of text chunks,
+    # holding no more than the value being decoded in memory.
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            elif not self.fill():
+                return None
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError("Expected '{}' but found '{}' in JSON stream".format(char, found))
+        self.pos += 1
+
+    def skip(self, char):
+        if self.peek() == char:
+            self.pos += 1
+            return True
+        return False
+
+    def may_continue(self, end):
+        # A number followed by nothing but characters that could still be
+        # part of it (like "97." or "1e") may continue in the next chunk
+        if self.buffer[self.pos] not in NUMBER_START:
+            return False
+        return all(char in NUMBER_CHARS for char in self.buffer[end:])
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+                if self.eof or not self.may_continue(end):
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+
+            self.fill()
+
+
+def iter_array_items(chunks, key):
+    # Yields the items of the array under `key` in a top-level JSON object,
+    # decoding them one at a time as the chunks arrive. Raises if the
+    # object has no `key`, rather than looking like an empty array.
+    reader = JsonReader(chunks)
+    reader.expect('{')
+    found = False
+
+    while not reader.skip('}'):
+        name = reader.value()
+        reader.expect(':')
+
+        if name != key:
+            reader.value()
+        else:
+            found = True
+            reader.expect('[')
+            while not reader.skip(']'):
+                yield reader.value()
+                reader.skip(',')
+
+        reader.skip(',')
+
+    if not found:
+        raise ValueError("Expected '{}' in JSON stream but it was not found".format(key))
+
+
+def decode_utf8(chunks):
+    utf8_decoder = codecs.getincrementaldecoder('utf-8')()
+    for chunk in chunks:
+        text = utf8_decoder.decode(chunk)
+        if text:
+            yield text
+
+    text = utf8_decoder.decode(b'', final=True)
+    if text:
+        yield text
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if len(batch) > 0:
+        yield batch
@@ -0,0 +1,167 @@
+import collections
+import re
+import threading
+import time
+import urllib.parse
+
+import singer
+import singer.metrics
+from singer.metrics import Point, Tag
+logger = singer.get_logger()
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+# Path segments holding ids (uuids, or anything with a digit but the API
+# version) are collapsed so requests are grouped by endpoint
+ID_SEGMENT = re.compile(r'^(?!v\d+$).*\d')
+
+_DONE = object()
+
+
+def get_endpoint(method, url):
+    segments = urllib.parse.urlparse(url).path.split('/')
+    path = '/'.join('{id}' if ID_SEGMENT.match(segment) else segment for segment in segments)
+    return '{} {}'.format(method, path)
+
+
+class Histogram(object):
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, fraction):
+        # the upper bound of the bucket the percentile falls in
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= fraction * self.count:
+                return min(bound, self.max)
+        return self.max
+
+    def buckets(self):
+        return {str(bound): count for (bound, count) in zip(LATENCY_BUCKETS, self.counts) if count > 0}
+
+
+class StreamStats(object):
+    def __init__(self):
+        self.pages = 0
+        self.records = 0
+        self.fetch_seconds = 0.0
+        self.transform_seconds = 0.0
+        self.write_seconds = 0.0
+
+
+class RunMetrics(object):
+    # Collects request, page and record metrics from every thread for the
+    # whole run. Each request is also emitted as a Singer
+    # http_request_duration metric as it completes; the rest are emitted
+    # as totals by log_summary() at the end of the run.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = collections.defaultdict(Histogram)
+        self.errors = collections.Counter()
+        self.retries = collections.Counter()
+        self.streams = collections.defaultdict(StreamStats)
+        self.local = threading.local()
+
+    def wrap(self, request):
+        def request_with_metrics(method, url, *args, **kwargs):
+            endpoint = get_endpoint(method, url)
+            with singer.metrics.http_request_timer(endpoint) as timer:
+                try:
+                    response = request(method, url, *args, **kwargs)
+                    timer.tags[Tag.http_status_code] = response.status
+                    return response
+                except Exception as e:
+                    timer.tags[Tag.http_status_code] = getattr(e, 'status', None)
+                    with self.lock:
+                        self.errors[endpoint] += 1
+                    raise
+                finally:
+                    self.local.last_request_seconds = timer.elapsed()
+                    with self.lock:
+                        self.requests[endpoint].observe(self.local.last_request_seconds)
+
+        return request_with_metrics
+
+    def install(self, rest_client):
+        rest_client.request = self.wrap(rest_client.request)
+
+    def last_request_seconds(self):
+        # how long this thread's last request took, not counting any time
+        # spent waiting on the rate limiter or backing off
+        return getattr(self.local, 'last_request_seconds', None)
+
+    def observe_retry(self, details):
+        name = details['target'].__name__
+        with self.lock:
+            self.retries[name] += 1
+        singer.metrics.log(logger, Point('counter', 'retry_count', 1, {Tag.endpoint: name}))
+
+    def timed_pages(self, stream, pages):
+        # times how long the stream waits on each page: the requests, the
+        # SDK's deserialization, or a prefetch queue
+        pages = iter(pages)
+        while True:
+            start = time.time()
+            page = next(pages, _DONE)
+            elapsed = time.time() - start
+            with self.lock:
+                self.streams[stream].fetch_seconds += elapsed
+
+            if page is _DONE:
+                return
+            yield page
+
+    def observe_page(self, stream, records, transform_seconds, write_seconds):
+        with self.lock:
+            stats = self.streams[stream]
+            stats.pages += 1
+            stats.records += records
+            stats.transform_seconds += transform_seconds
+            stats.write_seconds += write_seconds
+
+    def log_summary(self):
+        with self.lock:
+            requests = dict(self.requests)
+            streams = dict(self.streams)
+            retries = dict(self.retries)
+            errors = dict(self.errors)
+
+        logger.info("Run summary:")
+        for endpoint, histogram in sorted(requests.items()):
+            # the Singer spec only has counters and timers, so each bucket
+            # is a counter tagged with its upper bound
+            for bound, count in histogram.buckets().items():
+                tags = {Tag.endpoint: endpoint, 'upper_bound': bound}
+                singer.metrics.log(logger, Point('counter', 'http_request_duration_bucket', count, tags))
+            logger.info("  {}: {} requests, {} errors, {:.1f}s total, p50 {:.2f}s, p95 {:.2f}s, max {:.2f}s".format(
+                endpoint, histogram.count, errors.get(endpoint, 0), histogram.total,
+                histogram.percentile(0.5), histogram.percentile(0.95), histogram.max))
+
+        for stream, stats in sorted(streams.items()):
+            tags = {Tag.endpoint: stream}
+            singer.metrics.log(logger, Point('counter', 'page_count', stats.pages, tags))
+            singer.metrics.log(logger, Point('timer', 'fetch_duration', stats.fetch_seconds, tags))
+            singer.metrics.log(logger, Point('timer', 'transform_duration', stats.transform_seconds, tags))
+            singer.metrics.log(logger, Point('timer', 'write_duration', stats.write_seconds, tags))
+            logger.info("  {}: {} records in {} pages, {:.1f}s fetching, {:.1f}s transforming, {:.1f}s writing".format(
+                stream, stats.records, stats.pages, stats.fetch_seconds, stats.transform_seconds, stats.write_seconds))
+
+        for name, count in sorted(retries.items()):
+            logger.info("  {}: retried {} times".format(name, count))
+
+
+run_metrics = RunMetrics()
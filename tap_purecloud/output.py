@@ -0,0 +1,115 @@
+import importlib
+import sys
+import threading
+
+import singer
+logger = singer.get_logger()
+
+DEFAULT_BUFFER_SIZE = 64 * 1024
+DEFAULT_JSON_ENCODER = 'singer'
+
+
+def dumps_singer(message):
+    return singer.format_message(message)
+
+
+def dumps_orjson(message):
+    return _encoders['orjson'].dumps(message.asdict()).decode('utf-8')
+
+
+def dumps_ujson(message):
+    return _encoders['ujson'].dumps(message.asdict(), ensure_ascii=False, escape_forward_slashes=False)
+
+
+ENCODERS = {
+    'singer': dumps_singer,
+    'orjson': dumps_orjson,
+    'ujson': dumps_ujson,
+}
+
+_encoders = {}
+
+
+def load_encoder(name):
+    if name not in ENCODERS:
+        raise ValueError("Unknown output_json_encoder '{}', expected one of {}".format(name, sorted(ENCODERS)))
+
+    if name != DEFAULT_JSON_ENCODER:
+        try:
+            _encoders[name] = importlib.import_module(name)
+        except ImportError:
+            logger.warning("{} is not installed, writing output with the default encoder".format(name))
+            name = DEFAULT_JSON_ENCODER
+
+    return ENCODERS[name]
+
+
+class OutputWriter(object):
+    # Collects serialized messages and writes them to stdout in large
+    # chunks instead of writing and flushing every line. Streams may be
+    # synced from several threads at once, so every message goes through
+    # the lock and lines from different streams never interleave. STATE
+    # messages flush everything before them, so a bookmark never reaches
+    # the target ahead of the records it covers.
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE, dumps=dumps_singer):
+        self.lock = threading.RLock()
+        self.lines = []
+        self.size = 0
+        self.configure(buffer_size, dumps)
+
+    def configure(self, buffer_size, dumps):
+        with self.lock:
+            self.flush()
+            self.buffer_size = buffer_size
+            self.dumps = dumps
+
+    def write(self, message):
+        line = self.dumps(message) + '\n'
+        with self.lock:
+            self.lines.append(line)
+            self.size += len(line)
+            if self.size >= self.buffer_size:
+                self.flush()
+
+    def write_many(self, messages):
+        lines = [self.dumps(message) + '\n' for message in messages]
+        with self.lock:
+            self.lines.extend(lines)
+            self.size += sum(len(line) for line in lines)
+            if self.size >= self.buffer_size:
+                self.flush()
+
+    def flush(self):
+        with self.lock:
+            if len(self.lines) > 0:
+                sys.stdout.write(''.join(self.lines))
+                self.lines = []
+                self.size = 0
+            sys.stdout.flush()
+
+
+writer = OutputWriter()
+
+
+def configure(config):
+    buffer_size = config.get('output_buffer_size', DEFAULT_BUFFER_SIZE)
+    dumps = load_encoder(config.get('output_json_encoder', DEFAULT_JSON_ENCODER))
+    writer.configure(buffer_size, dumps)
+
+
+def write_schema(stream_name, schema, key_properties):
+    writer.write(singer.SchemaMessage(stream=stream_name, schema=schema, key_properties=key_properties))
+
+
+def write_records(stream_name, records):
+    writer.write_many(singer.RecordMessage(stream=stream_name, record=record) for record in records)
+
+
+def write_state(value):
+    with writer.lock:
+        writer.write(singer.StateMessage(value=value))
+        writer.flush()
+
+
+def flush():
+    writer.flush()
@@ -0,0 +1,88 @@
+import threading
+
+import singer
+logger = singer.get_logger()
+
+DEFAULT_PAGE_SIZE = 100
+MIN_PAGE_SIZE = 25
+DEFAULT_TARGET_SECONDS = 5.0
+
+# Largest page size each stream's endpoint accepts. Where the documented
+# limit wasn't certain, this stays at the size the tap always used.
+MAX_PAGE_SIZES = {
+    'users': 500,
+    'groups': 500,
+    'queues': 500,
+    'location': 100,
+    'presence': 100,
+    'queue_membership': 100,
+    'queue_wrapup_code': 100,
+    'conversation': 100,
+    'user_state': 100,
+}
+
+_tuners = {}
+_saved_sizes = {}
+_tuners_lock = threading.Lock()
+
+
+class PageSizeTuner(object):
+    # Picks the page size for each pagination run of a stream. It starts at
+    # the endpoint's maximum, halves after a page slower than the target
+    # latency and doubles again (up to the maximum) after full pages that
+    # come back well within it. Page numbers depend on the page size, so a
+    # new size only applies from the next pagination run; streams that
+    # paginate once per run pick it up from the state in the next run.
+    def __init__(self, stream, max_size, target_seconds, fixed=False, size=None):
+        self.stream = stream
+        self.max_size = max_size
+        self.min_size = min(MIN_PAGE_SIZE, max_size)
+        self.target_seconds = target_seconds
+        self.fixed = fixed
+        self.size = max_size if size is None else min(max_size, max(self.min_size, size))
+        self.lock = threading.Lock()
+
+    def observe(self, page_size, seconds, records):
+        if self.fixed or seconds is None:
+            return
+
+        with self.lock:
+            size = self.size
+            if seconds > self.target_seconds and page_size > self.min_size:
+                size = max(self.min_size, page_size // 2)
+            elif seconds < self.target_seconds / 4 and records >= page_size and page_size < self.max_size:
+                size = min(self.max_size, page_size * 2)
+
+            if size != self.size:
+                logger.info("Page size for {} is now {} ({} records took {:.2f}s)".format(self.stream, size, records, seconds))
+                self.size = size
+
+
+def get_tuner(config, stream):
+    # Every pagination run of a stream shares one tuner. A size set for the
+    # stream in page_sizes is used as is; otherwise it starts from the size
+    # the last run settled on.
+    with _tuners_lock:
+        if stream not in _tuners:
+            target_seconds = config.get('page_latency_target_seconds', DEFAULT_TARGET_SECONDS)
+            configured = config.get('page_sizes', {}).get(stream)
+            if configured is not None:
+                _tuners[stream] = PageSizeTuner(stream, configured, target_seconds, fixed=True)
+            else:
+                max_size = MAX_PAGE_SIZES.get(stream, DEFAULT_PAGE_SIZE)
+                _tuners[stream] = PageSizeTuner(stream, max_size, target_seconds, size=_saved_sizes.get(stream))
+        return _tuners[stream]
+
+
+def load_sizes(state):
+    with _tuners_lock:
+        _saved_sizes.clear()
+        _saved_sizes.update(state.get('page_sizes', {}))
+
+
+def get_sizes():
+    # the tuned size of every stream, to be saved in the state for the next run
+    with _tuners_lock:
+        sizes = dict(_saved_sizes)
+        sizes.update({stream: tuner.size for (stream, tuner) in _tuners.items() if not tuner.fixed})
+    return sizes
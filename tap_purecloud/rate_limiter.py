@@ -0,0 +1,142 @@
+import threading
+import time
+
+import singer
+logger = singer.get_logger()
+
+DEFAULT_REQUESTS_PER_SECOND = 5
+MIN_REQUESTS_PER_SECOND = 0.1
+DEFAULT_RETRY_SECONDS = 30
+
+# Start slowing down once this fraction of the org's quota has been used
+SLOWDOWN_THRESHOLD = 0.8
+
+RETRY_AFTER_HEADER = 'retry-after'
+RATE_LIMIT_ALLOWED_HEADER = 'inin-ratelimit-allowed'
+RATE_LIMIT_COUNT_HEADER = 'inin-ratelimit-count'
+RATE_LIMIT_RESET_HEADER = 'inin-ratelimit-reset'
+
+
+def parse_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_headers(headers):
+    if headers is None:
+        return {}
+    return {k.lower(): v for (k, v) in headers.items()}
+
+
+def response_headers(response):
+    urllib3_response = getattr(response, 'urllib3_response', None)
+    return getattr(urllib3_response, 'headers', None)
+
+
+class RateLimiter(object):
+    # A token bucket shared by every request the tap makes. The refill rate
+    # follows the rate limit headers PureCloud returns, backing off as the
+    # quota runs low and pausing everyone when a Retry-After is received.
+    def __init__(self, max_rate=DEFAULT_REQUESTS_PER_SECOND):
+        self.lock = threading.Lock()
+        self.paused_until = 0
+        self.configure(max_rate)
+
+    def configure(self, max_rate):
+        with self.lock:
+            self.max_rate = max_rate
+            self.rate = max_rate
+            self.burst = max(1, max_rate)
+            self.tokens = self.burst
+            self.updated = time.monotonic()
+
+    @property
+    def current_rate(self):
+        return self.rate
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    elapsed = now - max(self.updated, self.paused_until)
+                    self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+                    self.updated = now
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def observe(self, headers):
+        headers = normalize_headers(headers)
+
+        retry_after = parse_number(headers.get(RETRY_AFTER_HEADER))
+        allowed = parse_number(headers.get(RATE_LIMIT_ALLOWED_HEADER))
+        count = parse_number(headers.get(RATE_LIMIT_COUNT_HEADER))
+        reset = parse_number(headers.get(RATE_LIMIT_RESET_HEADER))
+
+        with self.lock:
+            now = time.monotonic()
+
+            if retry_after is not None:
+                logger.warning("Rate limited, pausing requests for {}s".format(retry_after))
+                self.paused_until = max(self.paused_until, now + retry_after)
+                self.tokens = 0
+
+            if allowed is None or count is None:
+                return
+
+            remaining = allowed - count
+            if count >= allowed * SLOWDOWN_THRESHOLD:
+                # spread what is left of the quota over the rest of the period
+                rate = max(MIN_REQUESTS_PER_SECOND, remaining / max(reset or 1, 1))
+                if remaining <= 0 and reset is not None:
+                    self.paused_until = max(self.paused_until, now + reset)
+            else:
+                rate = self.rate * 2
+
+            rate = min(self.max_rate, rate)
+            if rate < self.rate:
+                logger.debug("{} of {} requests used, slowing to {:.2f} requests/s".format(int(count), int(allowed), rate))
+            self.rate = rate
+
+    def retry_delay(self):
+        with self.lock:
+            remaining = self.paused_until - time.monotonic()
+
+        if remaining > 0:
+            return remaining
+        return DEFAULT_RETRY_SECONDS
+
+    def wrap(self, request):
+        def limited_request(*args, **kwargs):
+            self.acquire()
+            try:
+                response = request(*args, **kwargs)
+            except Exception as e:
+                self.observe(getattr(e, 'headers', None))
+                raise
+            self.observe(response_headers(response))
+            return response
+        return limited_request
+
+    def install(self, rest_client):
+        rest_client.request = self.wrap(rest_client.request)
+
+
+def retry_wait(limiter):
+    # backoff wait generator: wait for as long as the server asked us to
+    while True:
+        yield limiter.retry_delay()
+
+
+limiter = RateLimiter()
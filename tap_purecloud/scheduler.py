@@ -0,0 +1,188 @@
+import collections
+import concurrent.futures
+import datetime
+import queue
+import threading
+import time
+
+import singer
+logger = singer.get_logger()
+
+_DONE = object()
+
+
+def date_windows(start_date, end_date, incr=datetime.timedelta(days=1)):
+    window_start = start_date
+    while window_start < end_date:
+        window_end = window_start + incr
+        yield window_start, window_end
+        window_start = window_end
+
+
+class WindowPlanner(object):
+    # Sizes analytics query windows from the page counts of earlier windows:
+    # quiet periods are merged into multi-day windows and busy ones are cut
+    # down to hour-level slices, aiming for target_pages pages per window.
+    def __init__(self, target_pages, min_window=datetime.timedelta(hours=1),
+                 max_window=datetime.timedelta(days=7), initial_window=datetime.timedelta(days=1)):
+        self.target_pages = target_pages
+        self.min_window = min_window
+        self.max_window = max_window
+        self.initial_window = initial_window
+        self.pages_per_hour = None
+        self.lock = threading.Lock()
+
+    def observe(self, window, pages):
+        hours = (window[1] - window[0]).total_seconds() / 3600
+        pages_per_hour = pages / hours
+
+        with self.lock:
+            if self.pages_per_hour is None:
+                self.pages_per_hour = pages_per_hour
+            else:
+                self.pages_per_hour = (self.pages_per_hour + pages_per_hour) / 2
+
+    def observed(self, window, pages):
+        # pass pages through, recording how many non-empty pages there were
+        page_count = 0
+        for page in pages:
+            if page:
+                page_count += 1
+            yield page
+        self.observe(window, page_count)
+
+    def next_window_size(self):
+        with self.lock:
+            pages_per_hour = self.pages_per_hour
+
+        if pages_per_hour is None:
+            return self.initial_window
+        elif pages_per_hour == 0:
+            return self.max_window
+
+        hours = int(self.target_pages / pages_per_hour)
+        window = datetime.timedelta(hours=hours)
+        return max(self.min_window, min(self.max_window, window))
+
+    def windows(self, start_date, end_date):
+        window_start = start_date
+        while window_start < end_date:
+            window_end = min(window_start + self.next_window_size(), end_date)
+            yield window_start, window_end
+            window_start = window_end
+
+
+class _Raised(object):
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(generator, buffer_size):
+    # Runs generator on a background thread, keeping up to buffer_size items
+    # ready so that producing the next item overlaps with consuming this one
+    buffer = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in generator:
+                if not put(item):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(_Raised(e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            elif isinstance(item, _Raised):
+                raise item.error
+            yield item
+    finally:
+        stopped.set()
+
+
+def ordered_map(func, items, max_workers):
+    # Runs func over items with up to max_workers calls in flight, yielding
+    # (item, result) pairs in the same order as items. Items are pulled
+    # lazily so at most max_workers results are ever buffered.
+    pending = collections.deque()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        items = iter(items)
+
+        def submit_next():
+            item = next(items, _DONE)
+            if item is _DONE:
+                return False
+            pending.append((item, executor.submit(func, item)))
+            return True
+
+        while len(pending) < max_workers and submit_next():
+            pass
+
+        try:
+            while pending:
+                item, future = pending.popleft()
+                result = future.result()
+                submit_next()
+                yield item, result
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+def map_windows(fetch_window, windows, max_concurrent_windows):
+    # fetch_window returns an iterable of pages for a window. Serially, pages
+    # are streamed straight through. Concurrently, each window is fetched in
+    # full on a worker and handed back in window order.
+    if max_concurrent_windows <= 1:
+        for window in windows:
+            yield window, fetch_window(window)
+    else:
+        fetch_all = lambda window: list(fetch_window(window))
+        for window, pages in ordered_map(fetch_all, windows, max_concurrent_windows):
+            yield window, pages
+
+
+def run_streams(syncs, max_workers):
+    # The top-level streams don't depend on each other, so they can be
+    # synced side by side. The first failure cancels any stream that has
+    # not started yet and is re-raised once running streams finish.
+    if max_workers <= 1:
+        for sync in syncs:
+            sync()
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(timed, sync) for sync in syncs]
+
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def timed(sync):
+    name = getattr(sync, 'func', sync).__name__
+
+    start = time.time()
+    sync()
+    logger.info("Finished {} in {:.1f}s".format(name, time.time() - start))
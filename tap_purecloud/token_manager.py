@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+import singer
+logger = singer.get_logger()
+
+# Refresh once this fraction of the token's lifetime has passed
+REFRESH_AT_FRACTION = 0.8
+MIN_REMAINING_SECONDS = 300
+RETRY_REFRESH_SECONDS = 30
+
+
+class TokenManager(object):
+    # Keeps the SDK configurations supplied with a valid access token. The
+    # token is refreshed on a background timer before it expires; requests
+    # already in flight keep the token they were sent with. Tokens can be
+    # cached on disk by client id so short, frequent runs skip the auth call.
+    def __init__(self, config, request_token, configurations, cache_path=None):
+        self.config = config
+        self.request_token = request_token
+        self.configurations = configurations
+        self.cache_path = cache_path
+        self.timer = None
+        self.lock = threading.Lock()
+        self.stopped = False
+
+    def start(self):
+        cached = self.load_cached()
+        if cached is not None:
+            logger.info("Using cached access token")
+            self.apply(cached['access_token'], cached['expires_at'])
+        else:
+            self.refresh()
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            if self.timer is not None:
+                self.timer.cancel()
+
+    def refresh(self):
+        logger.info("Getting access token")
+        response = self.request_token(self.config)
+        expires_at = time.time() + response['expires_in']
+
+        self.apply(response['access_token'], expires_at)
+        self.save_cached(response['access_token'], expires_at)
+
+    def refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.warning("Failed to refresh access token, retrying in {}s".format(RETRY_REFRESH_SECONDS))
+            logger.warning(e)
+            self.schedule(RETRY_REFRESH_SECONDS)
+
+    def apply(self, access_token, expires_at):
+        for configuration in self.configurations:
+            configuration.access_token = access_token
+
+        lifetime = expires_at - time.time()
+        self.schedule(max(0, min(lifetime * REFRESH_AT_FRACTION, lifetime - MIN_REMAINING_SECONDS)))
+
+    def schedule(self, delay):
+        with self.lock:
+            if self.stopped:
+                return
+
+            if self.timer is not None:
+                self.timer.cancel()
+
+            logger.info("Refreshing access token in {:.0f}s".format(delay))
+            self.timer = threading.Timer(delay, self.refresh_in_background)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def load_cache(self):
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return {}
+
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def load_cached(self):
+        cached = self.load_cache().get(self.config['client_id'])
+        if cached is None or cached.get('domain') != self.config['domain']:
+            return None
+        elif cached['expires_at'] - time.time() < MIN_REMAINING_SECONDS:
+            return None
+        return cached
+
+    def save_cached(self, access_token, expires_at):
+        if self.cache_path is None:
+            return
+
+        cache = self.load_cache()
+        cache[self.config['client_id']] = {
+            'domain': self.config['domain'],
+            'access_token': access_token,
+            'expires_at': expires_at,
+        }
+
+        # the cache holds live credentials, so keep it private to this user
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.token-cache-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
@@ -1,4 +1,3 @@
-
 import PureCloudPlatformApiSdk
 
 # For fetching historical adherence
@@ -11,47 +10,165 @@ import time
 import singer
 logger = singer.get_logger()
 
-MAX_TRIES = 12
-WEBHOOK_WAIT = 5
+CONNECT_TIMEOUT = 60
+NOTIFICATION_TIMEOUT = 600
+RECONNECT_WAIT = 5
+RECEIVE_TIMEOUT = 60
+# channels expire after 24 hours, so they are replaced a little before that
+CHANNEL_MAX_AGE = 23 * 60 * 60
+# notifications nobody is waiting for are kept this long, in case the query
+# that asked for one hasn't started waiting yet
+UNCLAIMED_NOTIFICATION_SECONDS = 300
 ADHERENCE_CHANNEL = 'v2.users.{}.workforcemanagement.historicaladherencequery'
 
-async def get_websocket_msg(uri):
-    async with websockets.connect(uri) as websocket:
-        for i in range(MAX_TRIES):
-            resp = await websocket.recv()
-            data = json.loads(resp)
-            body = data.get('eventBody', {})
 
-            logger.info("GOT WEBSOCKET DATA")
-            logger.info(body)
+class NotificationLost(RuntimeError):
+    # The channel was disconnected or replaced while a query was waiting on
+    # it, so its notification may never arrive; submit the query again.
+    pass
 
-            if body.get('id'):
-                return body
 
-        raise RuntimeError("Did not find expected message")
+class NotificationChannel(object):
+    # One notification channel and websocket, kept open for the whole sync.
+    # Notifications are matched to outstanding queries by their id, so
+    # queries can be submitted back to back from any number of threads.
+    # Whenever the websocket drops, a new channel is created and subscribed,
+    # and every query waiting at the time gets a NotificationLost.
+    def __init__(self, config, topic_template):
+        self.topic_id = topic_template.format(config.get('client_id'))
+        self.websocket_uri = self.create_channel()
+
+        self.notifications = {}
+        self.condition = threading.Condition()
+        self.connected = False
+        self.generation = 0
+        self.closed = False
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+        try:
+            self.wait_until_connected()
+        except RuntimeError:
+            self.close()
+            raise
+
+    def create_channel(self):
+        api = PureCloudPlatformApiSdk.NotificationsApi()
+        api_response = api.post_channels()
+
+        topic = PureCloudPlatformApiSdk.ChannelTopic()
+        topic.id = self.topic_id
+
+        api.post_channels_channel_id_subscriptions(api_response.id, [topic])
+        logger.info("Listening on topic {} with channel {}".format(self.topic_id, api_response.id))
+        return api_response.connect_uri
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(self.listen())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.loop.close()
 
-def get_historical_adherence(config, result_reference):
-    api = PureCloudPlatformApiSdk.NotificationsApi()
-    api_response = api.post_channels()
+    async def listen(self):
+        while not self.closed:
+            try:
+                if self.websocket_uri is None:
+                    self.websocket_uri = await self.loop.run_in_executor(None, self.create_channel)
 
-    client_id = config.get('client_id')
-    channel_id = ADHERENCE_CHANNEL.format(client_id)
+                async with websockets.connect(self.websocket_uri) as websocket:
+                    self.set_connected()
+                    opened = time.time()
+                    while time.time() - opened < CHANNEL_MAX_AGE:
+                        try:
+                            message = await asyncio.wait_for(websocket.recv(), RECEIVE_TIMEOUT)
+                        except asyncio.TimeoutError:
+                            continue
+                        self.receive(message)
 
-    topic = PureCloudPlatformApiSdk.ChannelTopic()
-    topic.id = channel_id
+                logger.info("Notification channel is about to expire, replacing it")
+            except Exception as e:
+                # anything but cancellation reconnects, so waiting queries
+                # aren't left to time out on a dead listener
+                logger.warning("Notification websocket failed ({!r}), reconnecting".format(e))
+                await asyncio.sleep(RECONNECT_WAIT)
+            finally:
+                self.set_disconnected()
 
-    notification_resp = api.post_channels_channel_id_subscriptions(api_response.id, [topic])
-    logger.info("Listening on topic {}".format(channel_id))
+    def set_connected(self):
+        with self.condition:
+            self.connected = True
+            self.condition.notify_all()
 
-    def loop_in_thread(loop, websocket_uri, res):
-        asyncio.set_event_loop(loop)
-        func = get_websocket_msg(websocket_uri)
-        val = loop.run_until_complete(func)
-        result_reference.update(val)
+    def set_disconnected(self):
+        # the next connection uses a fresh channel, and queries waiting on
+        # this one are told to resubmit
+        self.websocket_uri = None
+        with self.condition:
+            if self.connected:
+                self.connected = False
+                self.generation += 1
+                self.condition.notify_all()
+
+    def receive(self, message):
+        try:
+            data = json.loads(message)
+        except ValueError:
+            logger.warning("Ignoring notification that isn't JSON: {!r}".format(message[:200]))
+            return
+
+        body = data.get('eventBody', {})
+
+        if not body.get('id'):
+            return
+
+        logger.info("Got notification for {}".format(body['id']))
+        now = time.time()
+        with self.condition:
+            expired = [key for (key, (received, _)) in self.notifications.items()
+                       if now - received > UNCLAIMED_NOTIFICATION_SECONDS]
+            for key in expired:
+                logger.warning("Dropping unclaimed notification for {}".format(key))
+                del self.notifications[key]
+
+            self.notifications[body['id']] = (now, body)
+            self.condition.notify_all()
+
+    def wait_until_connected(self, timeout=CONNECT_TIMEOUT):
+        # Returns the connection's generation, to pass to wait_for for
+        # queries submitted from now on
+        with self.condition:
+            self.condition.wait_for(lambda: self.connected or self.closed, timeout)
+            if not self.connected:
+                raise RuntimeError("Could not connect to notification channel")
+            return self.generation
+
+    def wait_for(self, notification_id, generation, timeout=NOTIFICATION_TIMEOUT):
+        with self.condition:
+            self.condition.wait_for(lambda: notification_id in self.notifications or self.generation != generation, timeout)
+
+            if notification_id in self.notifications:
+                _, body = self.notifications.pop(notification_id)
+                return body
+            elif self.generation != generation:
+                raise NotificationLost("Notification channel reconnected while waiting for {}".format(notification_id))
+            else:
+                raise RuntimeError("Did not find expected message")
 
-    websocket_uri = api_response.connect_uri
-    loop = asyncio.get_event_loop()
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
 
-    thread = threading.Thread(target=loop_in_thread, args=(loop, websocket_uri, result_reference))
-    thread.start()
-    return thread
+        if self.thread.is_alive():
+            try:
+                self.loop.call_soon_threadsafe(self.task.cancel)
+            except RuntimeError:
+                # the loop closed as the listener exited
+                pass
+        self.thread.join()
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+import bench_sync
+import fake_purecloud
+
+
+@pytest.fixture(scope='session')
+def fake():
+    # one fake API for the whole session: the tap's SDK clients, including
+    # the per-thread ones, are pointed at it once
+    fake = fake_purecloud.FakePureCloud().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(scope='session')
+def tap(fake):
+    return bench_sync.setup_tap(fake.host, {'max_requests_per_second': 1000})
@@ -0,0 +1,134 @@
+import datetime
+import json
+
+import pytest
+import requests
+
+import tap_purecloud.websocket_helper as websocket_helper
+
+DAY = 24 * 60 * 60
+
+
+def day_metric(day, adherence_secs=27000, exception_secs=300):
+    return {
+        'dayStartOffsetSecs': day * DAY,
+        'adherenceScheduleSecs': adherence_secs,
+        'conformanceScheduleSecs': 28800,
+        'conformanceActualSecs': 28000,
+        'exceptionCount': 1,
+        'exceptionDurationSecs': exception_secs,
+        'impactSeconds': 100,
+        'scheduleLengthSecs': 28800,
+        'actualLengthSecs': 28500,
+    }
+
+
+def exception(day, start, end):
+    return {
+        'startOffsetSeconds': day * DAY + start,
+        'endOffsetSeconds': day * DAY + end,
+        'impact': 'Negative',
+    }
+
+
+def make_record(days, day_metrics, exceptions):
+    return {
+        'userId': 'user-1',
+        'startDate': '2018-01-01T00:00:00.000Z',
+        'endDate': '2018-01-{:02d}T00:00:00.000Z'.format(1 + days),
+        'impact': 'Positive',
+        'adherencePercentage': 95.0,
+        'conformancePercentage': 98.0,
+        'dayMetrics': day_metrics,
+        'exceptionInfo': exceptions,
+    }
+
+
+def test_multi_day_record_is_split_into_days(tap):
+    record = make_record(3, [day_metric(d) for d in range(3)], [exception(0, 3600, 3900), exception(2, 7200, 7500)])
+
+    days = tap.split_adherence_record(record, 3)
+
+    assert [d['startDate'] for d in days] == [
+        '2018-01-01T00:00:00.000Z', '2018-01-02T00:00:00.000Z', '2018-01-03T00:00:00.000Z']
+    assert [d['endDate'] for d in days] == [
+        '2018-01-02T00:00:00.000Z', '2018-01-03T00:00:00.000Z', '2018-01-04T00:00:00.000Z']
+
+    # offsets are rebased to the start of each day
+    assert [[m['dayStartOffsetSecs'] for m in d['dayMetrics']] for d in days] == [[0], [0], [0]]
+    assert days[0]['exceptionInfo'] == [exception(0, 3600, 3900)]
+    assert days[1]['exceptionInfo'] == []
+    assert days[2]['exceptionInfo'] == [exception(0, 7200, 7500)]
+
+    for d in days:
+        assert d['impact'] == 'Positive'
+        assert d['adherencePercentage'] == pytest.approx(100.0 * 26700 / 27000)
+        assert d['conformancePercentage'] == pytest.approx(100.0 * 28000 / 28800)
+
+
+def test_zero_adherence_is_kept(tap):
+    record = make_record(2, [day_metric(0, exception_secs=27000), day_metric(1)], [])
+
+    days = tap.split_adherence_record(record, 2)
+
+    assert days[0]['adherencePercentage'] == 0.0
+    assert days[1]['adherencePercentage'] > 0
+
+
+def test_day_percentages_from_the_api_are_used(tap):
+    metric = dict(day_metric(0), adherencePercentage=12.5, conformancePercentage=0.0, impact='Negative')
+    record = make_record(2, [metric, day_metric(1)], [])
+
+    day = tap.split_adherence_record(record, 2)[0]
+
+    assert (day['impact'], day['adherencePercentage'], day['conformancePercentage']) == ('Negative', 12.5, 0.0)
+
+
+def test_day_without_metrics(tap):
+    record = make_record(2, [day_metric(1)], [])
+
+    days = tap.split_adherence_record(record, 2)
+
+    assert days[0]['dayMetrics'] == []
+    assert (days[0]['impact'], days[0]['adherencePercentage'], days[0]['conformancePercentage']) == (None, None, None)
+    assert days[1]['adherencePercentage'] is not None
+
+
+def test_single_day_record_is_unchanged(tap):
+    record = make_record(1, [day_metric(0)], [exception(0, 3600, 3900)])
+    original = json.loads(json.dumps(record))
+
+    assert tap.split_adherence_record(record, 1) == [original]
+
+
+def test_last_range_shorter_than_query_days(fake, tap, capsys):
+    today = datetime.date.today()
+    config = {
+        'start_date': today - datetime.timedelta(days=4),
+        'adherence_query_days': 3,
+    }
+    user_ids = ['user-1', 'user-2']
+
+    # five days from the day before start_date: one 3 day query and one of 2
+    channel = websocket_helper.NotificationChannel({'client_id': 'test'}, websocket_helper.ADHERENCE_CHANNEL)
+    try:
+        tap.sync_historical_adherence(config, channel, 'unit-0', user_ids, False)
+    finally:
+        channel.close()
+    tap.output.flush()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    records = [m['record'] for m in messages if m['type'] == 'RECORD']
+
+    expected_days = [(today - datetime.timedelta(days=d)).strftime('%Y-%m-%d') for d in range(5, 0, -1)]
+    for user_id in user_ids:
+        user_records = [r for r in records if r['userId'] == user_id]
+        assert [r['startDate'][:10] for r in user_records] == expected_days
+        for r in user_records:
+            assert [m['dayStartOffsetSecs'] for m in r['dayMetrics']] == [0]
+            assert r['management_unit_id'] == 'unit-0'
+
+
+def test_download_error_raises(fake, tap):
+    # an unknown or expired download is answered with a JSON error body
+    with pytest.raises(requests.HTTPError):
+        list(tap.iter_historical_adherence_download(fake.host + '/downloads/adherence/expired'))
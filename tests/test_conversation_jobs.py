@@ -0,0 +1,104 @@
+import datetime
+import json
+
+import pytest
+
+WEEK_START = datetime.datetime(2018, 1, 1)
+WEEK_END = datetime.datetime(2018, 1, 8)
+
+
+@pytest.fixture(autouse=True)
+def reset_fake(fake, tap, monkeypatch):
+    # small pages, so a week of results takes several
+    monkeypatch.setattr(tap, 'CONVERSATION_JOB_PAGE_SIZE', 100)
+    fake.volumes['conversations_per_day'] = 30
+    fake.job_polls = 1
+    fake.job_final_state = 'FULFILLED'
+    fake.jobs_available_until = None
+    fake.jobs.clear()
+
+
+def read_messages(tap, capsys):
+    tap.output.flush()
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def conversation_records(messages):
+    return [m['record'] for m in messages if m['type'] == 'RECORD' and m['stream'] == 'conversation']
+
+
+def test_fulfilled_job_is_paged_through_with_its_cursor(fake, tap, capsys):
+    config = {'conversation_job_poll_seconds': 0}
+    state = {}
+    fake.job_polls = 3
+
+    requests_before = fake.request_count
+    first_page = tap.sync_conversation_jobs(config, state, WEEK_START, WEEK_END, True)
+    messages = read_messages(tap, capsys)
+
+    records = conversation_records(messages)
+    assert first_page is False
+    assert len(records) == 7 * 30
+    assert len(set(r['conversation_id'] for r in records)) == len(records)
+
+    # one submit, three status checks and three pages of 100 results
+    assert fake.request_count - requests_before == 7
+    assert state['bookmarks']['conversation']['window_end'] == '2018-01-08T00:00:00'
+    assert messages[-1]['type'] == 'STATE'
+
+
+def test_jobs_are_split_into_weeks(fake, tap, capsys):
+    config = {'conversation_job_poll_seconds': 0}
+    end = WEEK_START + datetime.timedelta(days=10)
+
+    tap.sync_conversation_jobs(config, {}, WEEK_START.date(), end, True)
+    records = conversation_records(read_messages(tap, capsys))
+
+    intervals = sorted(job['interval'] for job in fake.jobs.values())
+    assert intervals == [
+        '2018-01-01T00:00:00.000Z/2018-01-08T00:00:00.000Z',
+        '2018-01-08T00:00:00.000Z/2018-01-11T00:00:00.000Z',
+    ]
+    assert len(records) == 10 * 30
+
+
+def test_failed_job_raises(fake, tap, capsys):
+    fake.job_final_state = 'FAILED'
+
+    with pytest.raises(RuntimeError, match='failed: Failed in fake API'):
+        tap.sync_conversation_jobs({'conversation_job_poll_seconds': 0}, {}, WEEK_START, WEEK_END, True)
+
+    assert conversation_records(read_messages(tap, capsys)) == []
+
+
+def test_unfinished_job_times_out(fake, tap):
+    fake.job_polls = 10 ** 6
+    job_id = tap.submit_conversation_details_job((WEEK_START, WEEK_END))
+
+    with pytest.raises(RuntimeError, match='did not finish'):
+        tap.wait_for_conversation_details_job(job_id, 0.01, timeout=0.1)
+
+
+def test_resumes_from_window_end(fake, tap, capsys):
+    fake.volumes['conversations_per_day'] = 10
+    today = datetime.date.today()
+    window_end = datetime.datetime.combine(today - datetime.timedelta(days=20), datetime.time())
+
+    config = {
+        'start_date': today - datetime.timedelta(days=30),
+        'conversation_jobs_older_than_days': 14,
+        'conversation_job_poll_seconds': 0,
+    }
+    state = {'bookmarks': {'conversation': {'window_end': window_end.strftime('%Y-%m-%dT%H:%M:%S')}}}
+
+    tap.sync_conversations(config, state)
+    records = conversation_records(read_messages(tap, capsys))
+
+    jobs_end = window_end + datetime.timedelta(days=6)
+    intervals = [job['interval'] for job in fake.jobs.values()]
+    assert intervals == [tap.format_interval(window_end, jobs_end)]
+
+    # nothing before the bookmark is synced again, by jobs or by queries
+    starts = [datetime.datetime.strptime(r['conversation_start'][:19], '%Y-%m-%dT%H:%M:%S') for r in records]
+    assert min(starts) == window_end
+    assert len(records) == 10 * 21
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import tap_purecloud.json_stream as json_stream
+
+SAMPLE = json.dumps({
+    'downloadUrl': 'https://example.com/adherence.json',
+    'data': [
+        {
+            'userId': 'user-1',
+            'startDate': '2018-01-01T00:00:00.000Z',
+            'adherencePercentage': 97.5,
+            'conformancePercentage': 100,
+            'impact': 'Positive',
+            'dayMetrics': [{'dayStartOffsetSecs': 0, 'exceptionDurationSecs': 300}],
+            'exceptionInfo': [],
+        },
+        {
+            'userId': 'usér-2 ☃ "quoted"',
+            'startDate': '2018-01-01T00:00:00.000Z',
+            'adherencePercentage': None,
+            'impact': None,
+            'dayMetrics': [],
+            'deleted': False,
+        },
+        -1.25e-3,
+        12345,
+        'text',
+        True,
+        None,
+    ],
+    'lookupIdToSecondaryPresenceId': {},
+}, ensure_ascii=False)
+
+EXPECTED = json.loads(SAMPLE)['data']
+
+
+def test_items_at_every_split():
+    for i in range(len(SAMPLE) + 1):
+        chunks = [SAMPLE[:i], SAMPLE[i:]]
+        assert list(json_stream.iter_array_items(chunks, 'data')) == EXPECTED, "split at {}".format(i)
+
+
+def test_items_from_single_characters():
+    assert list(json_stream.iter_array_items(iter(SAMPLE), 'data')) == EXPECTED
+
+
+def test_utf8_split_inside_a_character():
+    encoded = SAMPLE.encode('utf-8')
+    for i in range(len(encoded) + 1):
+        chunks = json_stream.decode_utf8([encoded[:i], encoded[i:]])
+        assert list(json_stream.iter_array_items(chunks, 'data')) == EXPECTED, "split at byte {}".format(i)
+
+
+def test_number_split_after_its_point():
+    assert list(json_stream.iter_array_items(['{"data": [97.', '5]}'], 'data')) == [97.5]
+    assert list(json_stream.iter_array_items(['{"data": [1e', '-3, -', '2]}'], 'data')) == [0.001, -2]
+
+
+def test_empty_array():
+    assert list(json_stream.iter_array_items(['{"data": []}'], 'data')) == []
+
+
+def test_missing_key_raises():
+    error_body = '{"message": "Request has expired", "code": "AccessDenied"}'
+    with pytest.raises(ValueError, match="'data'"):
+        list(json_stream.iter_array_items([error_body], 'data'))
+
+
+def test_truncated_download_raises():
+    with pytest.raises(ValueError):
+        list(json_stream.iter_array_items([SAMPLE[:len(SAMPLE) // 2]], 'data'))
+
+
+def test_batches():
+    assert list(json_stream.iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
@@ -0,0 +1,60 @@
+import pytest
+
+import tap_purecloud.page_sizes as page_sizes
+
+
+@pytest.fixture(autouse=True)
+def fresh_tuners(monkeypatch):
+    monkeypatch.setattr(page_sizes, '_tuners', {})
+    monkeypatch.setattr(page_sizes, '_saved_sizes', {})
+
+
+def test_slow_pages_halve_and_quick_full_pages_double():
+    tuner = page_sizes.get_tuner({'page_latency_target_seconds': 4}, 'users')
+    assert tuner.size == 500
+
+    tuner.observe(500, 6.0, 500)
+    assert tuner.size == 250
+
+    # quick but not full: the stream may just have run out of records
+    tuner.observe(250, 0.5, 10)
+    assert tuner.size == 250
+
+    tuner.observe(250, 0.5, 250)
+    assert tuner.size == 500
+
+
+def test_size_never_leaves_its_bounds():
+    tuner = page_sizes.get_tuner({'page_latency_target_seconds': 1}, 'conversation')
+    for _ in range(10):
+        tuner.observe(tuner.size, 5.0, tuner.size)
+    assert tuner.size == page_sizes.MIN_PAGE_SIZE
+
+    for _ in range(10):
+        tuner.observe(tuner.size, 0.01, tuner.size)
+    assert tuner.size == page_sizes.MAX_PAGE_SIZES['conversation']
+
+
+def test_configured_size_is_fixed_and_not_saved():
+    tuner = page_sizes.get_tuner({'page_sizes': {'groups': 40}}, 'groups')
+    tuner.observe(40, 60.0, 40)
+
+    assert tuner.size == 40
+    assert 'groups' not in page_sizes.get_sizes()
+
+
+def test_tuned_sizes_carry_over_to_the_next_run(monkeypatch):
+    page_sizes.load_sizes({'page_sizes': {'users': 125, 'queues': 5000}})
+
+    assert page_sizes.get_tuner({}, 'users').size == 125
+    # saved sizes are kept within the endpoint's limits
+    assert page_sizes.get_tuner({}, 'queues').size == 500
+
+    page_sizes.get_tuner({}, 'users').observe(125, 10.0, 125)
+    sizes = page_sizes.get_sizes()
+    assert sizes['users'] == 62
+
+    # the next run starts where this one left off
+    monkeypatch.setattr(page_sizes, '_tuners', {})
+    page_sizes.load_sizes({'page_sizes': sizes})
+    assert page_sizes.get_tuner({}, 'users').size == 62
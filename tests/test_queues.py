@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def queues(fake, tap, monkeypatch):
+    monkeypatch.setattr(tap.page_sizes, '_tuners', {})
+    monkeypatch.setitem(fake.volumes, 'queues', 2)
+    monkeypatch.setitem(fake.volumes, 'members_per_queue', 60)
+    monkeypatch.setitem(fake.volumes, 'wrapup_codes_per_queue', 30)
+
+
+def sync_queues(tap, capsys, config):
+    tap.sync_queues(config)
+    tap.output.flush()
+    messages = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    records = {}
+    for m in messages:
+        if m['type'] == 'RECORD':
+            records.setdefault(m['stream'], []).append(m['record'])
+    return records
+
+
+def keys(records):
+    return sorted((r['queue_id'], r['id']) for r in records)
+
+
+@pytest.mark.parametrize('page_sizes', [{}, {'queue_membership': 10, 'queue_wrapup_code': 7}])
+def test_queue_children_are_paged(fake, tap, capsys, queues, page_sizes):
+    requests_before = fake.request_count
+    records = sync_queues(tap, capsys, {'page_sizes': page_sizes})
+
+    members = records['queue_membership']
+    wrapup_codes = records['queue_wrapup_code']
+    assert keys(members) == sorted((q, 'user-{}'.format(i)) for q in ['queue-0', 'queue-1'] for i in range(60))
+    assert keys(wrapup_codes) == sorted((q, 'wrapup-{}'.format(i)) for q in ['queue-0', 'queue-1'] for i in range(30))
+
+    if page_sizes:
+        # one request for the queues, then 6 pages of members and 5 of
+        # wrapup codes for each queue
+        assert fake.request_count - requests_before == 1 + 2 * (6 + 5)
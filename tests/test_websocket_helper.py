@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+import tap_purecloud.websocket_helper as websocket_helper
+
+
+@pytest.fixture
+def channel(fake, tap, monkeypatch):
+    monkeypatch.setattr(websocket_helper, 'RECONNECT_WAIT', 0.1)
+    channel = websocket_helper.NotificationChannel({'client_id': 'test'}, websocket_helper.ADHERENCE_CHANNEL)
+    yield channel
+    channel.close()
+
+
+def wait_for_reconnect(channel, generation):
+    deadline = time.time() + 5
+    while channel.generation == generation or not channel.connected:
+        assert time.time() < deadline, "channel did not reconnect"
+        time.sleep(0.01)
+
+
+def test_notification_is_handed_to_its_query(fake, channel):
+    generation = channel.wait_until_connected()
+    fake.notify({'id': 'query-1', 'downloadUrl': 'https://example.com/1'})
+
+    assert channel.wait_for('query-1', generation, timeout=5)['downloadUrl'] == 'https://example.com/1'
+
+
+def test_waiting_queries_fail_fast_when_the_channel_drops(fake, channel):
+    generation = channel.wait_until_connected()
+    channels_before = next(fake.channel_ids)
+
+    errors = []
+
+    def wait():
+        try:
+            channel.wait_for('query-2', generation, timeout=30)
+        except websocket_helper.NotificationLost as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.1)
+
+    start = time.time()
+    fake.drop_websockets()
+    waiter.join(10)
+
+    assert len(errors) == 1
+    assert time.time() - start < 5
+
+    # the channel is replaced, and queries submitted after that still work
+    wait_for_reconnect(channel, generation)
+    assert next(fake.channel_ids) > channels_before + 1
+
+    generation = channel.wait_until_connected()
+    fake.notify({'id': 'query-3', 'downloadUrl': 'https://example.com/3'})
+    assert channel.wait_for('query-3', generation, timeout=5)['downloadUrl'] == 'https://example.com/3'
+
+
+def test_unclaimed_notifications_are_dropped(fake, channel, monkeypatch):
+    monkeypatch.setattr(websocket_helper, 'UNCLAIMED_NOTIFICATION_SECONDS', 0)
+    generation = channel.wait_until_connected()
+
+    fake.notify({'id': 'nobody-waits', 'downloadUrl': 'https://example.com/x'})
+    time.sleep(0.05)
+    fake.notify({'id': 'query-4', 'downloadUrl': 'https://example.com/4'})
+
+    channel.wait_for('query-4', generation, timeout=5)
+    assert channel.notifications == {}
+
+
+def test_close_after_the_listener_exits(channel):
+    channel.loop.call_soon_threadsafe(channel.task.cancel)
+    channel.thread.join(5)
+
+    channel.close()